@@ -1,10 +1,11 @@
 import argparse
 import json
+import resource
 import time
 import torch
 from torch.autograd import Variable
-from warpctc_pytorch import CTCLoss
 from tqdm import trange
+from loss import get_loss, loss_backends
 from model import DeepSpeech, supported_rnns
 
 parser = argparse.ArgumentParser()
@@ -20,9 +21,26 @@ parser.add_argument('--hidden-layers', default=5, type=int, help='Number of RNN
 parser.add_argument('--rnn-type', default='gru', help='Type of the RNN. rnn|gru|lstm are supported')
 parser.add_argument('--sample-rate', default=16000, type=int, help='Sample rate')
 parser.add_argument('--window-size', default=.02, type=float, help='Window size for spectrogram in seconds')
+parser.add_argument('--cuda', dest='cuda', action='store_true', help='Benchmark on the GPU instead of the CPU')
+parser.add_argument('--mixed-precision', dest='mixed_precision', action='store_true',
+                    help='Run the model under autocast with dynamic loss scaling, as train.py --mixed-precision')
+parser.add_argument('--amp-dtype', default=None, choices=['float16', 'bfloat16'],
+                    help='Data type of mixed precision, defaults to float16 with cuda and bfloat16 on the CPU')
+parser.add_argument('--loss-backend', default='warpctc', choices=loss_backends,
+                    help='CTC loss implementation, the warp-ctc bindings or the one built into PyTorch')
+parser.add_argument('--accumulate-steps', default=1, type=int,
+                    help='Split each batch into this many micro-batches whose gradients are accumulated, '
+                         'as train.py --accumulate-steps')
+parser.add_argument('--rnn-checkpointing', dest='rnn_checkpointing', action='store_true',
+                    help='Recompute the activations of each RNN layer in the backward pass')
 args = parser.parse_args()
+if args.amp_dtype is None:
+    args.amp_dtype = 'float16' if args.cuda else 'bfloat16'
+device = 'cuda' if args.cuda else 'cpu'
 
-input = torch.randn(args.batch_size, 1, 161, args.seconds * 100).cuda()
+input = torch.randn(args.batch_size, 1, 161, args.seconds * 100)
+if args.cuda:
+    input = input.cuda()
 
 rnn_type = args.rnn_type.lower()
 assert rnn_type in supported_rnns, "rnn_type should be either lstm, rnn or gru"
@@ -40,44 +58,66 @@ model = DeepSpeech(rnn_hidden_size=args.hidden_size,
                    rnn_type=supported_rnns[rnn_type])
 
 print("Number of parameters: %d" % DeepSpeech.get_param_size(model))
+if args.rnn_checkpointing:
+    model.set_rnn_checkpointing()
 
 parameters = model.parameters()
 optimizer = torch.optim.SGD(parameters, lr=3e-4,
                             momentum=0.9, nesterov=True)
-model = torch.nn.DataParallel(model).cuda()
-criterion = CTCLoss()
+if args.cuda:
+    model = torch.nn.DataParallel(model).cuda()
+criterion = get_loss(args.loss_backend)
+scaler = torch.amp.GradScaler(device, enabled=args.mixed_precision)
 
 seconds = int(args.seconds)
 batch_size = int(args.batch_size)
 
 
 def iteration(input_data):
-    target = torch.IntTensor(int(batch_size * ((seconds * 100) / 2))).fill_(1)  # targets, align half of the audio
-    target_size = torch.IntTensor(batch_size).fill_(int((seconds * 100) / 2))
-    input_percentages = torch.IntTensor(batch_size).fill_(1)
-
-    inputs = Variable(input_data, requires_grad=False)
-    target_sizes = Variable(target_size, requires_grad=False)
-    targets = Variable(target, requires_grad=False)
     start = time.time()
-    out = model(inputs)
-    out = out.transpose(0, 1)  # TxNxH
-
-    seq_length = out.size(0)
-    sizes = Variable(input_percentages.mul_(int(seq_length)).int(), requires_grad=False)
-    loss = criterion(out, targets, sizes, target_sizes)
-    loss = loss / inputs.size(0)  # average the loss by minibatch
-    # compute gradient
     optimizer.zero_grad()
-    loss.backward()
-    optimizer.step()
-    torch.cuda.synchronize()
+    for micro_batch in torch.chunk(input_data, args.accumulate_steps):
+        micro_batch_size = micro_batch.size(0)
+        # targets, align half of the audio
+        target = torch.IntTensor(int(micro_batch_size * ((seconds * 100) / 2))).fill_(1)
+        target_size = torch.IntTensor(micro_batch_size).fill_(int((seconds * 100) / 2))
+        input_percentages = torch.IntTensor(micro_batch_size).fill_(1)
+
+        inputs = Variable(micro_batch, requires_grad=False)
+        target_sizes = Variable(target_size, requires_grad=False)
+        targets = Variable(target, requires_grad=False)
+        with torch.autocast(device, dtype=getattr(torch, args.amp_dtype), enabled=args.mixed_precision):
+            out = model(inputs)
+        out = out.transpose(0, 1).float()  # TxNxH
+
+        seq_length = out.size(0)
+        sizes = Variable(input_percentages.mul_(int(seq_length)).int(), requires_grad=False)
+        loss = criterion(out, targets, sizes, target_sizes)
+        # compute gradient, averaged over the whole batch below
+        scaler.scale(loss).backward()
+        del loss
+        del out
+    scaler.unscale_(optimizer)
+    for param in model.parameters():
+        if param.grad is not None:
+            param.grad.data.div_(batch_size)
+    scaler.step(optimizer)
+    scaler.update()
+    if args.cuda:
+        torch.cuda.synchronize()
     end = time.time()
-    del loss
-    del out
     return start, end
 
 
+def peak_memory():
+    """
+    Peak memory in MB, allocated by tensors on the GPU or the peak resident set size of the process on the CPU.
+    """
+    if args.cuda:
+        return torch.cuda.max_memory_allocated() / 1024.0 ** 2
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
 def run_benchmark(input_data):
     print("Running dry runs...")
     for n in trange(args.dry_runs):
@@ -95,3 +135,11 @@ def run_benchmark(input_data):
 run_time = run_benchmark(input)
 
 print("\n Average run time: %.2fs" % run_time)
+settings = ['GPU allocated' if args.cuda else 'CPU resident']
+if args.mixed_precision:
+    settings.append('mixed precision ' + args.amp_dtype)
+if args.accumulate_steps > 1:
+    settings.append('%d micro-batches' % args.accumulate_steps)
+if args.rnn_checkpointing:
+    settings.append('RNN checkpointing')
+print(" Peak memory: %.1fMB (%s)" % (peak_memory(), ', '.join(settings)))
@@ -0,0 +1,60 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import scipy.io.wavfile
+
+from data.data_loader import load_audio, load_randomly_augmented_audio, randomly_augment_audio
+
+parser = argparse.ArgumentParser(description='Compares the sox and in process augmentation backends')
+parser.add_argument('--audio-path', default=None,
+                    help='Audio file to augment. If not given, a synthetic utterance is generated')
+parser.add_argument('--seconds', type=int, default=10, help='Duration of the synthetic utterance in seconds')
+parser.add_argument('--sample-rate', default=16000, type=int, help='Sample rate')
+parser.add_argument('--dry-runs', type=int, default=3, help='Dry runs before measuring performance')
+parser.add_argument('--runs', type=int, default=50, help='How many augmentations to measure per backend')
+args = parser.parse_args()
+
+
+def synthetic_audio(path, seconds, sample_rate):
+    t = np.arange(seconds * sample_rate) / float(sample_rate)
+    y = 8000 * np.sin(2 * np.pi * 220 * t) * (1 + np.sin(2 * np.pi * 3 * t)) / 2
+    y += np.random.randn(len(t)) * 500
+    scipy.io.wavfile.write(path, sample_rate, y.astype(np.int16))
+
+
+def sox_backend(path):
+    return load_randomly_augmented_audio(path, args.sample_rate)
+
+
+def numpy_backend(path):
+    return randomly_augment_audio(load_audio(path), args.sample_rate)
+
+
+def run_benchmark(augment, path):
+    for n in range(args.dry_runs):
+        augment(path)
+    start = time.time()
+    for n in range(args.runs):
+        augment(path)
+    return args.runs / (time.time() - start)
+
+
+if __name__ == '__main__':
+    audio_path = args.audio_path
+    if audio_path is None:
+        audio_file = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
+        audio_file.close()
+        audio_path = audio_file.name
+        synthetic_audio(audio_path, args.seconds, args.sample_rate)
+    try:
+        results = [(name, run_benchmark(augment, audio_path))
+                   for name, augment in (('sox', sox_backend), ('numpy', numpy_backend))]
+    finally:
+        if args.audio_path is None:
+            os.remove(audio_path)
+    for name, samples_per_sec in results:
+        print("%-6s %8.2f samples/sec" % (name, samples_per_sec))
+    print("Speedup of numpy over sox: %.2fx" % (results[1][1] / results[0][1]))
@@ -0,0 +1,72 @@
+from __future__ import print_function
+
+import argparse
+import time
+
+import torch
+
+from loss import get_loss, loss_backends
+
+parser = argparse.ArgumentParser(description='Compares the loss values and speed of the CTC loss backends')
+parser.add_argument('--batch-size', type=int, default=32, help='Size of input')
+parser.add_argument('--seconds', type=int, default=15,
+                    help='The size of the fake input in seconds, the model outputs 50 frames per second')
+parser.add_argument('--num-classes', type=int, default=29, help='Number of output classes, including the blank')
+parser.add_argument('--dry-runs', type=int, default=3, help='Dry runs before measuring performance')
+parser.add_argument('--runs', type=int, default=10, help='How many benchmark runs to measure performance')
+parser.add_argument('--cuda', dest='cuda', action='store_true', help='Compute the loss on the GPU')
+
+
+def fake_batch(batch_size, frames, num_classes, cuda=False):
+    """
+    Random activations and labels, the samples have between half and all of the frames and their labels cover a
+    third of the frames.
+    """
+    acts = torch.randn(frames, batch_size, num_classes)
+    act_lens = torch.randint(frames // 2, frames + 1, (batch_size,)).int()
+    act_lens[0] = frames
+    label_lens = (act_lens // 3).int()
+    labels = torch.randint(1, num_classes, (int(label_lens.sum()),)).int()
+    if cuda:
+        acts = acts.cuda()
+    return acts, labels, act_lens, label_lens
+
+
+def measure(criterion, acts, labels, act_lens, label_lens, dry_runs, runs, cuda=False):
+    """
+    :return: The loss, the gradient of the activations and the time of a forward and backward pass
+    """
+    for _ in range(dry_runs + 1):
+        inputs = acts.clone().requires_grad_()
+        loss = criterion(inputs, labels, act_lens, label_lens)
+        loss.sum().backward()
+    if cuda:
+        torch.cuda.synchronize()
+    start = time.time()
+    for _ in range(runs):
+        criterion(acts.clone().requires_grad_(), labels, act_lens, label_lens).sum().backward()
+    if cuda:
+        torch.cuda.synchronize()
+    return loss.item(), inputs.grad, (time.time() - start) / runs
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    frames = args.seconds * 50
+    acts, labels, act_lens, label_lens = fake_batch(args.batch_size, frames, args.num_classes, args.cuda)
+    results = []
+    for backend in loss_backends:
+        try:
+            criterion = get_loss(backend)
+        except ImportError as e:
+            print("{:>8}: not available ({})".format(backend, e))
+            continue
+        loss, grad, run_time = measure(criterion, acts, labels, act_lens, label_lens, args.dry_runs, args.runs,
+                                       args.cuda)
+        results.append((backend, loss, grad))
+        print("{:>8}: loss {:.3f}, {:.4f}s forward and backward, {:.0f} samples/s".format(
+            backend, loss, run_time, args.batch_size / run_time))
+    reference, reference_loss, reference_grad = results[0]
+    for backend, loss, grad in results[1:]:
+        print("{} vs {}: loss difference {:.2e}, largest gradient difference {:.2e}".format(
+            backend, reference, abs(loss - reference_loss), (grad - reference_grad).abs().max().item()))
@@ -0,0 +1,100 @@
+from __future__ import print_function
+
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from data.data_loader import SpectrogramParser
+from model import SpectrogramFrontend
+
+parser = argparse.ArgumentParser(description='Checks that the batched frontend of --batched-frontend computes the '
+                                             'spectrograms of SpectrogramParser.parse_audio and compares their speed')
+parser.add_argument('--seconds', type=float, nargs='+', default=[1, 3.3, 7.7],
+                    help='Lengths of the synthetic utterances in seconds, they are padded into one batch')
+parser.add_argument('--sample-rate', default=16000, type=int, help='Sample rate')
+parser.add_argument('--window-size', default=.02, type=float, help='Window size for spectrogram in seconds')
+parser.add_argument('--window-stride', default=.01, type=float, help='Window stride for spectrogram in seconds')
+parser.add_argument('--window', default='hamming', help='Window type for spectrogram generation')
+parser.add_argument('--tolerance', default=1e-2, type=float,
+                    help='Largest difference allowed between the normalized spectrograms of both paths. The FFTs of '
+                         'librosa and torch round differently, which is largest in the log of the quietest bins')
+parser.add_argument('--seed', default=0, type=int, help='Seed of the noise in the synthetic utterances')
+parser.add_argument('--dry-runs', type=int, default=1, help='Dry runs before measuring performance')
+parser.add_argument('--runs', type=int, default=5, help='How many runs to measure performance over')
+parser.add_argument('--cuda', action="store_true", help='Run the frontend on the GPU')
+
+
+def synthetic_waveforms(seconds, sample_rate, seed=0):
+    """
+    Tones with noise in the int16 range, as the data loader passes to the frontend.
+    """
+    random = np.random.RandomState(seed)
+    waveforms = []
+    for duration in seconds:
+        t = np.arange(int(duration * sample_rate)) / float(sample_rate)
+        y = 8000 * np.sin(2 * np.pi * 220 * t) * (1 + np.sin(2 * np.pi * 3 * t)) / 2 + random.randn(len(t)) * 500
+        waveforms.append(np.round(y).astype(np.int16))
+    return waveforms
+
+
+def pad_batch(waveforms, cuda=False):
+    audio = torch.zeros(len(waveforms), max(len(y) for y in waveforms), dtype=torch.int16)
+    for i, y in enumerate(waveforms):
+        audio[i, :len(y)] = torch.from_numpy(y)
+    lengths = torch.IntTensor([len(y) for y in waveforms])
+    return (audio.cuda() if cuda else audio), lengths
+
+
+def compare(spect_parser, frontend, waveforms, cuda=False):
+    """
+    :return: The largest absolute difference between the spectrograms of parse_audio and of the frontend
+    """
+    audio, lengths = pad_batch(waveforms, cuda)
+    with torch.no_grad():
+        spect, frame_lengths = frontend(audio, lengths)
+    spect = spect.cpu()
+    max_difference = 0
+    for i, y in enumerate(waveforms):
+        expected = spect_parser.parse_audio_data(y.astype(np.float32))
+        if int(frame_lengths[i]) != expected.size(1):
+            raise ValueError("The frontend computed {} frames for utterance {}, parse_audio {}".format(
+                int(frame_lengths[i]), i, expected.size(1)))
+        max_difference = max(max_difference, (spect[i, 0, :, :expected.size(1)] - expected).abs().max().item())
+    return max_difference
+
+
+def measure(function, dry_runs, runs, cuda=False):
+    for _ in range(dry_runs):
+        function()
+    if cuda:
+        torch.cuda.synchronize()
+    start = time.time()
+    for _ in range(runs):
+        function()
+    if cuda:
+        torch.cuda.synchronize()
+    return (time.time() - start) / runs
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    audio_conf = dict(sample_rate=args.sample_rate, window_size=args.window_size, window_stride=args.window_stride,
+                      window=args.window, noise_dir=None)
+    spect_parser = SpectrogramParser(audio_conf, normalize=True)
+    frontend = SpectrogramFrontend(audio_conf, normalize=True)
+    frontend = frontend.cuda() if args.cuda else frontend
+    waveforms = synthetic_waveforms(args.seconds, args.sample_rate, args.seed)
+
+    max_difference = compare(spect_parser, frontend, waveforms, args.cuda)
+    audio, lengths = pad_batch(waveforms, args.cuda)
+    parser_time = measure(lambda: [spect_parser.parse_audio_data(y.astype(np.float32)) for y in waveforms],
+                          args.dry_runs, args.runs)
+    with torch.no_grad():
+        frontend_time = measure(lambda: frontend(audio, lengths), args.dry_runs, args.runs, args.cuda)
+    print("Largest spectrogram difference {:.2e}, {:.4f}s per batch with parse_audio, {:.4f}s batched".format(
+        max_difference, parser_time, frontend_time))
+    if max_difference > args.tolerance:
+        raise ValueError("The batched frontend does not match parse_audio, largest difference {:.2e}".format(
+            max_difference))
@@ -0,0 +1,69 @@
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+parser = argparse.ArgumentParser(description='Measures the import time of the DeepSpeech entry points')
+parser.add_argument('--entry-points', nargs='+',
+                    default=['transcribe.py', 'test.py', 'train.py', 'server.py', 'model.py'],
+                    help='Scripts to start, each is run with --help so only its imports and argument parsing run')
+parser.add_argument('--runs', default=3, type=int, help='Runs per entry point, the fastest one is reported')
+parser.add_argument('--top', default=10, type=int, help='Number of slowest top level imports to list per entry point')
+parser.add_argument('--output-path', default=None, help='Write the report to this json file')
+
+heavy_modules = ('librosa', 'scipy.signal', 'torchaudio', 'warpctc_pytorch', 'ctcdecode', 'numba', 'Levenshtein')
+
+
+def parse_importtime(stderr):
+    """
+    Parses the report of python -X importtime.
+    :return: List of (module, self time, cumulative time, nesting level), times in seconds
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        level = (len(name) - len(name.lstrip(' '))) // 2
+        imports.append((name.strip(), int(self_us) / 1e6, int(cumulative_us) / 1e6, level))
+    return imports
+
+
+def measure(entry_point):
+    start = time.time()
+    process = subprocess.Popen([sys.executable, '-X', 'importtime', entry_point, '--help'],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    _, stderr = process.communicate()
+    wall_time = time.time() - start
+    if process.returncode != 0:
+        raise RuntimeError("{} failed:\n{}".format(entry_point, stderr))
+    return wall_time, parse_importtime(stderr)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    report = []
+    for entry_point in args.entry_points:
+        wall_time, imports = min((measure(entry_point) for _ in range(args.runs)), key=lambda run: run[0])
+        # the first import of a package is the one at the lowest nesting level, it includes all of its dependencies
+        top_level = sorted((i for i in imports if i[3] == 0), key=lambda i: i[2], reverse=True)
+        imported = set(name for name, _, _, _ in imports)
+        result = {
+            'entry_point': entry_point,
+            'wall_time': wall_time,
+            'import_time': sum(cumulative for _, _, cumulative, level in imports if level == 0),
+            'top_imports': [(name, cumulative) for name, _, cumulative, _ in top_level[:args.top]],
+            'heavy_modules': [name for name in heavy_modules if name in imported]
+        }
+        report.append(result)
+        print("{entry_point}: {wall_time:.3f}s wall time, {import_time:.3f}s importing".format(**result))
+        for name, cumulative in result['top_imports']:
+            print("  {:<40} {:.3f}s".format(name, cumulative))
+        print("  heavy modules loaded: {}".format(', '.join(result['heavy_modules']) or 'none'))
+    if args.output_path:
+        with open(args.output_path, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
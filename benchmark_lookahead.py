@@ -0,0 +1,61 @@
+from __future__ import print_function
+
+import argparse
+import time
+
+import torch
+
+from model import Lookahead
+
+parser = argparse.ArgumentParser(description='Compares the lookahead layer with its previous stack based version')
+parser.add_argument('--batch-size', type=int, default=32, help='Size of input')
+parser.add_argument('--seconds', type=int, nargs='+', default=[1, 5, 15],
+                    help='Sizes of the fake input in seconds, the lookahead runs on the frames after the convolutions')
+parser.add_argument('--hidden-size', default=800, type=int, help='Hidden size of RNNs')
+parser.add_argument('--context', default=20, type=int, help='Context of the lookahead layer')
+parser.add_argument('--dry-runs', type=int, default=3, help='Dry runs before measuring performance')
+parser.add_argument('--runs', type=int, default=10, help='How many benchmark runs to measure performance')
+parser.add_argument('--cuda', action="store_true", help='Run on the GPU')
+
+
+def stacked_lookahead(lookahead, input):
+    # the previous implementation, stacks a window of context + 1 frames for every frame
+    seq_len = input.size(0)
+    padding = input.new_zeros(lookahead.context, *(input.size()[1:]))
+    x = torch.cat((input, padding), 0)
+    x = [x[i:i + lookahead.context + 1] for i in range(seq_len)]  # TxLxNxH
+    x = torch.stack(x)
+    x = x.permute(0, 2, 3, 1)  # TxNxHxL
+    return torch.mul(x, lookahead.weight).sum(dim=3)
+
+
+def measure(function, input, dry_runs, runs, cuda):
+    for _ in range(dry_runs):
+        function(input).sum().backward()
+    if cuda:
+        torch.cuda.synchronize()
+        torch.cuda.reset_max_memory_allocated()
+    start = time.time()
+    for _ in range(runs):
+        function(input).sum().backward()
+    if cuda:
+        torch.cuda.synchronize()
+    peak_memory = torch.cuda.max_memory_allocated() / 1024.0 ** 2 if cuda else None
+    return (time.time() - start) / runs, peak_memory
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    lookahead = Lookahead(args.hidden_size, args.context)
+    lookahead = lookahead.cuda() if args.cuda else lookahead
+    for seconds in args.seconds:
+        frames = seconds * 100 // 2  # the convolutions halve the time resolution
+        input = torch.randn(frames, args.batch_size, args.hidden_size, requires_grad=True)
+        input = input.cuda() if args.cuda else input
+        with torch.no_grad():
+            max_difference = (stacked_lookahead(lookahead, input) - lookahead(input)).abs().max().item()
+        print("{}s, {} frames, largest difference {:.2e}".format(seconds, frames, max_difference))
+        for name, function in (('stacked', lambda x: stacked_lookahead(lookahead, x)), ('conv1d', lookahead)):
+            run_time, peak_memory = measure(function, input, args.dry_runs, args.runs, args.cuda)
+            print("  {:>8}: {:.4f}s forward and backward".format(name, run_time), end='')
+            print(", {:.1f}MB peak memory".format(peak_memory) if peak_memory is not None else '')
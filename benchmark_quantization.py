@@ -0,0 +1,124 @@
+from __future__ import print_function
+
+import argparse
+import io
+import os
+import tempfile
+import time
+
+import torch
+
+from data.data_loader import AudioDataLoader, SpectrogramDataset
+from decoder import GreedyDecoder
+from model import DeepSpeech
+
+parser = argparse.ArgumentParser(description='Compares a float32 model with its int8 quantized version on the CPU')
+parser.add_argument('--model-path', default='models/deepspeech_final.pth',
+                    help='Path to a float32 model file created by training')
+parser.add_argument('--test-manifest', default=None,
+                    help='Manifest to compare WER and CER on, only latency and size are compared if not set')
+parser.add_argument('--batch-size', default=1, type=int, help='Batch size of the latency measurement and evaluation')
+parser.add_argument('--seconds', default=10, type=int, help='Length of the fake input of the latency measurement')
+parser.add_argument('--dry-runs', default=3, type=int, help='Dry runs before measuring latency')
+parser.add_argument('--runs', default=10, type=int, help='How many runs to measure latency over')
+parser.add_argument('--threads', default=None, type=int, help='Number of threads torch uses, defaults to all cores')
+parser.add_argument('--num-workers', default=4, type=int, help='Number of workers used in data-loading')
+
+
+def serialized_size(model):
+    buffer = io.BytesIO()
+    torch.save(DeepSpeech.serialize(model), buffer)
+    return len(buffer.getvalue())
+
+
+def round_trip(model, inputs):
+    """
+    Saves the model as quantize.py does and loads it back with DeepSpeech.load_model, as transcribe.py, test.py and
+    server.py do.
+    :return: The largest absolute difference between the outputs of the model and of the loaded model
+    """
+    model_file = tempfile.NamedTemporaryFile(suffix='.pth', delete=False)
+    model_file.close()
+    try:
+        torch.save(DeepSpeech.serialize(model), model_file.name)
+        loaded = DeepSpeech.load_model(model_file.name)
+    finally:
+        os.remove(model_file.name)
+    loaded.eval()
+    with torch.no_grad():
+        return (model(inputs) - loaded(inputs)).abs().max().item()
+
+
+def measure_latency(model, inputs, dry_runs, runs):
+    with torch.no_grad():
+        for _ in range(dry_runs):
+            model(inputs)
+        start = time.time()
+        for _ in range(runs):
+            model(inputs)
+    return (time.time() - start) / runs
+
+
+def evaluate(model, test_loader, decoder):
+    total_wer, total_cer = 0, 0
+    for inputs, targets, input_percentages, target_sizes in test_loader:
+        input_sizes = input_percentages.mul_(int(inputs.size(3))).round().int()
+        with torch.no_grad():
+            out, sizes = model(inputs, input_sizes)
+        out = out.transpose(0, 1)  # TxNxH
+        decoded_output, _ = decoder.decode(out.data, sizes.cpu())
+        split_targets = []
+        offset = 0
+        for size in target_sizes:
+            split_targets.append(targets[offset:offset + size].tolist())
+            offset += size
+        target_strings = decoder.convert_to_strings(split_targets)
+        for x in range(len(target_strings)):
+            transcript, reference = decoded_output[x][0], target_strings[x][0]
+            total_wer += decoder.wer(transcript, reference) / float(len(reference.split()))
+            total_cer += decoder.cer(transcript, reference) / float(len(reference))
+    num_samples = len(test_loader.dataset)
+    return total_wer / num_samples * 100, total_cer / num_samples * 100
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    model = DeepSpeech.load_model(args.model_path)
+    model.eval()
+    quantized_model = DeepSpeech.quantize(model)
+    labels = DeepSpeech.get_labels(model)
+    audio_conf = DeepSpeech.get_audio_conf(model)
+
+    freq_size = int(audio_conf.get('sample_rate', 16000) * audio_conf.get('window_size', .02)) // 2 + 1
+    inputs = torch.randn(args.batch_size, 1, freq_size, args.seconds * 100)
+    if args.test_manifest:
+        test_dataset = SpectrogramDataset(audio_conf=audio_conf, manifest_filepath=args.test_manifest, labels=labels,
+                                          normalize=True)
+        test_loader = AudioDataLoader(test_dataset, batch_size=args.batch_size, num_workers=args.num_workers)
+        decoder = GreedyDecoder(labels, blank_index=labels.index('_'))
+
+    results = []
+    for name, m in (('float32', model), ('int8', quantized_model)):
+        result = {
+            'name': name,
+            'size': serialized_size(m) / 1024.0 ** 2,
+            'latency': measure_latency(m, inputs, args.dry_runs, args.runs)
+        }
+        if args.test_manifest:
+            result['wer'], result['cer'] = evaluate(m, test_loader, decoder)
+        results.append(result)
+        print("{name:>8}: {size:.1f}MB, {latency:.3f}s per batch of {seconds}s".format(seconds=args.seconds,
+                                                                                      **result), end='')
+        if args.test_manifest:
+            print(", WER {wer:.3f} CER {cer:.3f}".format(**result), end='')
+        print()
+    float_result, quantized_result = results
+    print("Speedup {:.2f}x, {:.1f}x smaller".format(float_result['latency'] / quantized_result['latency'],
+                                                  float_result['size'] / quantized_result['size']))
+    max_difference = round_trip(quantized_model, inputs)
+    print("Largest output difference of the saved and loaded int8 model {:.2e}".format(max_difference))
+    if max_difference > 0:
+        raise ValueError("The saved int8 model does not match the quantized model, largest difference {:.2e}".format(
+            max_difference))
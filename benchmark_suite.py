@@ -0,0 +1,343 @@
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import OrderedDict
+
+import numpy as np
+import scipy.io.wavfile
+import torch
+
+from data.data_loader import AudioDataLoader, SpectrogramDataset, SpectrogramParser
+from decoder import GreedyDecoder, PrefixBeamCTCDecoder
+from loss import get_loss
+from model import DeepSpeech, SpectrogramFrontend, supported_rnns
+
+parser = argparse.ArgumentParser(description='Runs the benchmark scenarios of the data pipeline, training, inference '
+                                             'and decoding, and writes their results as JSON')
+parser.add_argument('--scenarios', nargs='+', default=None,
+                    help='Scenarios to run, all by default: features, loader, train_step, inference, decode, scoring')
+parser.add_argument('--output-path', default=None, help='Where to write the results as JSON')
+parser.add_argument('--compare', default=None, help='Results of an earlier run to compare with, e.g. of another commit')
+parser.add_argument('--labels-path', default='labels.json', help='Path to the labels of the model')
+parser.add_argument('--seconds', type=int, nargs='+', default=[2, 5, 10],
+                    help='Utterance lengths in seconds, each length is run separately')
+parser.add_argument('--batch-sizes', type=int, nargs='+', default=[4, 16], help='Batch sizes of the training step')
+parser.add_argument('--num-utterances', type=int, default=32, help='Number of synthetic utterances for the loader')
+parser.add_argument('--num-workers', type=int, default=2, help='Number of data loader workers')
+parser.add_argument('--hidden-size', default=400, type=int,
+                    help='Hidden size of RNNs, smaller than the default model so every scenario runs on the CPU')
+parser.add_argument('--hidden-layers', default=3, type=int, help='Number of RNN layers')
+parser.add_argument('--rnn-type', default='gru', help='Type of the RNN. rnn|gru|lstm are supported')
+parser.add_argument('--beam-width', default=10, type=int, help='Beam width of the beam search decoders')
+parser.add_argument('--dry-runs', type=int, default=1, help='Dry runs before measuring each scenario')
+parser.add_argument('--runs', type=int, default=3, help='How many runs to measure each scenario over')
+parser.add_argument('--threads', type=int, default=None, help='Number of threads torch uses, its default if not given')
+parser.add_argument('--cuda', dest='cuda', action='store_true',
+                    help='Run the training step and inference on the GPU, the other scenarios always run on the CPU')
+
+audio_conf = dict(sample_rate=16000, window_size=.02, window_stride=.01, window='hamming', noise_dir=None)
+words = ['THE', 'QUICK', 'BROWN', 'FOX', 'JUMPS', 'OVER', 'LAZY', 'DOG', 'SPEECH', 'MODEL', 'AUDIO', 'SAMPLE']
+
+
+def synthetic_audio(seconds, sample_rate=16000):
+    """
+    A tone with amplitude modulation and noise, in the int16 range load_audio returns.
+    """
+    t = np.arange(int(seconds * sample_rate)) / float(sample_rate)
+    y = 8000 * np.sin(2 * np.pi * 220 * t) * (1 + np.sin(2 * np.pi * 3 * t)) / 2
+    return (y + np.random.randn(len(t)) * 500).astype(np.float32)
+
+
+def synthetic_sentence(num_words):
+    return ' '.join(np.random.choice(words, num_words))
+
+
+def write_dataset(directory, num_utterances, seconds, sample_rate=16000):
+    """
+    Writes utterances of the given lengths with transcripts and a manifest, and a few noise files.
+    :return: Path to the manifest and to the noise directory
+    """
+    os.makedirs(os.path.join(directory, 'noise'))
+    manifest_path = os.path.join(directory, 'manifest.csv')
+    with open(manifest_path, 'w') as manifest:
+        for index in range(num_utterances):
+            duration = seconds[index % len(seconds)]
+            audio_path = os.path.join(directory, '%d.wav' % index)
+            transcript_path = os.path.join(directory, '%d.txt' % index)
+            scipy.io.wavfile.write(audio_path, sample_rate, synthetic_audio(duration, sample_rate).astype(np.int16))
+            with open(transcript_path, 'w') as transcript_file:
+                transcript_file.write(synthetic_sentence(duration * 3))
+            manifest.write('%s,%s,%f\n' % (audio_path, transcript_path, duration))
+    for index in range(3):
+        noise = np.random.randn(sample_rate * 5) * 2000
+        scipy.io.wavfile.write(os.path.join(directory, 'noise', '%d.wav' % index), sample_rate,
+                               noise.astype(np.int16))
+    return manifest_path, os.path.join(directory, 'noise')
+
+
+def timed(function, dry_runs, runs, cuda=False):
+    """
+    :return: Mean seconds per call of function, after the dry runs
+    """
+    for _ in range(dry_runs):
+        function()
+    if cuda:
+        torch.cuda.synchronize()
+    start = time.time()
+    for _ in range(runs):
+        function()
+    if cuda:
+        torch.cuda.synchronize()
+    return (time.time() - start) / runs
+
+
+def result(scenario, params, metric, value, unit):
+    return OrderedDict([('scenario', scenario), ('params', params), ('metric', metric), ('value', value),
+                        ('unit', unit)])
+
+
+def create_model(args, labels):
+    model = DeepSpeech(rnn_hidden_size=args.hidden_size,
+                       nb_layers=args.hidden_layers,
+                       audio_conf=audio_conf,
+                       labels=labels,
+                       rnn_type=supported_rnns[args.rnn_type.lower()])
+    return model.cuda() if args.cuda else model
+
+
+def features_scenario(args, context):
+    """
+    Seconds of audio turned into spectrograms per second, one utterance at a time as the data loader workers do and
+    as a batch with SpectrogramFrontend.
+    """
+    spect_parser = SpectrogramParser(audio_conf, normalize=True)
+    frontend = SpectrogramFrontend(audio_conf)
+    results = []
+    for seconds in args.seconds:
+        y = synthetic_audio(seconds)
+        run_time = timed(lambda: spect_parser.parse_audio_data(y), args.dry_runs, args.runs)
+        results.append(result('features', {'seconds': seconds, 'method': 'librosa'}, 'audio_seconds_per_second',
+                              seconds / run_time, 's/s'))
+        batch_size = max(args.batch_sizes)
+        audio = torch.from_numpy(np.stack([y] * batch_size))
+        lengths = torch.IntTensor([len(y)] * batch_size)
+        with torch.no_grad():
+            run_time = timed(lambda: frontend(audio, lengths), args.dry_runs, args.runs)
+        results.append(result('features', {'seconds': seconds, 'method': 'frontend', 'batch_size': batch_size},
+                              'audio_seconds_per_second', seconds * batch_size / run_time, 's/s'))
+    return results
+
+
+def loader_scenario(args, context):
+    """
+    Samples per second of a pass over the synthetic dataset with the data loader, per augmentation setting.
+    """
+    noise_conf = dict(noise_dir=context['noise_dir'], noise_prob=1.0, noise_levels=(0.0, 0.5))
+    settings = [('none', dict(augment=False), {}, False),
+                ('numpy', dict(augment=True, augment_backend='numpy'), {}, False),
+                ('sox', dict(augment=True, augment_backend='sox'), {}, True),
+                ('noise', dict(augment=False), noise_conf, True),
+                ('noise_bank', dict(augment=False), dict(noise_conf, noise_bank=True), False)]
+    results = []
+    for name, dataset_args, conf, needs_sox in settings:
+        if needs_sox and shutil.which('sox') is None:
+            print("loader: skipping %s, sox is not installed" % name)
+            continue
+        dataset = SpectrogramDataset(dict(audio_conf, **conf), context['manifest_path'], context['labels'],
+                                     normalize=True, **dataset_args)
+        # the workers are kept between passes, so the dry runs take their start up and imports out of the timing
+        loader = AudioDataLoader(dataset, batch_size=min(args.batch_sizes), num_workers=args.num_workers,
+                                 persistent_workers=args.num_workers > 0)
+
+        def epoch():
+            for _ in loader:
+                pass
+
+        run_time = timed(epoch, args.dry_runs, args.runs)
+        params = {'augmentation': name, 'num_workers': args.num_workers, 'utterances': len(dataset)}
+        results.append(result('loader', params, 'samples_per_second', len(dataset) / run_time, 'samples/s'))
+    return results
+
+
+def train_step_scenario(args, context):
+    """
+    Samples per second of a training step with the native CTC loss, per batch size and utterance length.
+    """
+    model = create_model(args, context['labels'])
+    model.train()
+    optimizer = torch.optim.SGD(model.parameters(), lr=3e-4, momentum=0.9, nesterov=True)
+    criterion = get_loss('native')
+    num_classes = len(context['labels'])
+    results = []
+    for batch_size in args.batch_sizes:
+        for seconds in args.seconds:
+            inputs = torch.randn(batch_size, 1, 161, seconds * 100)
+            input_sizes = torch.IntTensor([seconds * 100] * batch_size)
+            targets = torch.randint(1, num_classes, (batch_size * seconds * 10,)).int()
+            target_sizes = torch.IntTensor([seconds * 10] * batch_size)
+            if args.cuda:
+                inputs = inputs.cuda()
+
+            def step():
+                out, output_sizes = model(inputs, input_sizes)
+                loss = criterion(out.transpose(0, 1).float(), targets, output_sizes.cpu(), target_sizes)
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+
+            run_time = timed(step, args.dry_runs, args.runs, args.cuda)
+            params = {'batch_size': batch_size, 'seconds': seconds}
+            results.append(result('train_step', params, 'samples_per_second', batch_size / run_time, 'samples/s'))
+            results.append(result('train_step', params, 'step_time', run_time, 's'))
+    return results
+
+
+def inference_scenario(args, context):
+    """
+    Real time factor of transcribing a single utterance, the time of feature extraction, the model and greedy
+    decoding divided by the length of the audio. Below 1 is faster than real time.
+    """
+    model = create_model(args, context['labels'])
+    model.eval()
+    spect_parser = SpectrogramParser(audio_conf, normalize=True)
+    decoder = GreedyDecoder(context['labels'])
+    results = []
+    for seconds in args.seconds:
+        y = synthetic_audio(seconds)
+
+        def transcribe():
+            spect = spect_parser.parse_audio_data(y).contiguous()
+            spect = spect.view(1, 1, spect.size(0), spect.size(1))
+            with torch.no_grad():
+                out = model(spect.cuda() if args.cuda else spect)
+            decoder.decode(out.transpose(0, 1))  # TxNxH
+
+        run_time = timed(transcribe, args.dry_runs, args.runs, args.cuda)
+        results.append(result('inference', {'seconds': seconds}, 'real_time_factor', run_time / seconds, 'x'))
+    return results
+
+
+def decode_scenario(args, context):
+    """
+    Utterances decoded per second from random output probabilities, greedily and with beam search.
+    """
+    labels = context['labels']
+    decoders = [('greedy', GreedyDecoder(labels)),
+                ('prefix_beam', PrefixBeamCTCDecoder(labels, beam_width=args.beam_width, num_processes=1))]
+    try:
+        from decoder import BeamCTCDecoder
+
+        decoders.append(('beam', BeamCTCDecoder(labels, beam_width=args.beam_width, num_processes=1)))
+    except ImportError as e:
+        print("decode: skipping beam, not available ({})".format(e))
+    batch_size = min(args.batch_sizes)
+    results = []
+    for seconds in args.seconds:
+        # peaked distributions, as a trained model outputs, keep the beams from all being equally likely
+        probs = torch.softmax(torch.randn(seconds * 50, batch_size, len(labels)) * 5, dim=-1)
+        sizes = torch.IntTensor([seconds * 50] * batch_size)
+        for name, decoder in decoders:
+            run_time = timed(lambda: decoder.decode(probs, sizes), args.dry_runs, args.runs)
+            results.append(result('decode', {'decoder': name, 'seconds': seconds, 'batch_size': batch_size},
+                                  'utterances_per_second', batch_size / run_time, 'utterances/s'))
+    return results
+
+
+def scoring_scenario(args, context):
+    """
+    Sentence pairs scored per second with the word and character error rates of test.py.
+    """
+    decoder = GreedyDecoder(context['labels'])
+    pairs = [(synthetic_sentence(30), synthetic_sentence(30)) for _ in range(1000)]
+    results = []
+    for name, score in (('wer', decoder.wer), ('cer', decoder.cer)):
+        def score_all():
+            for reference, transcript in pairs:
+                score(transcript, reference)
+
+        run_time = timed(score_all, args.dry_runs, args.runs)
+        results.append(result('scoring', {'metric': name, 'words': 30}, 'pairs_per_second', len(pairs) / run_time,
+                              'pairs/s'))
+    return results
+
+
+scenarios = OrderedDict([('features', features_scenario),
+                         ('loader', loader_scenario),
+                         ('train_step', train_step_scenario),
+                         ('inference', inference_scenario),
+                         ('decode', decode_scenario),
+                         ('scoring', scoring_scenario)])
+
+
+def result_key(record):
+    return record['scenario'], json.dumps(record['params'], sort_keys=True), record['metric']
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results, baseline):
+    """
+    Prints each result next to the same result of the baseline, with the ratio of the two.
+    """
+    baseline = dict((result_key(record), record['value']) for record in baseline['results'])
+    for record in results:
+        key = result_key(record)
+        if key in baseline:
+            print("{:<10} {:<60} {:<25} {:12.4f} vs {:12.4f} ({:.2f}x)".format(
+                key[0], key[1], key[2], record['value'], baseline[key], record['value'] / baseline[key]))
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    selected = args.scenarios or list(scenarios)
+    unknown = [name for name in selected if name not in scenarios]
+    if unknown:
+        raise ValueError("Unknown scenarios %s, choose from %s" % (', '.join(unknown), ', '.join(scenarios)))
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    with open(args.labels_path) as label_file:
+        labels = str(''.join(json.load(label_file)))
+
+    directory = tempfile.mkdtemp()
+    try:
+        manifest_path, noise_dir = write_dataset(directory, args.num_utterances, args.seconds)
+        context = dict(labels=labels, manifest_path=manifest_path, noise_dir=noise_dir)
+        results = []
+        for name in selected:
+            start = time.time()
+            scenario_results = scenarios[name](args, context)
+            for record in scenario_results:
+                print("{:<10} {:<60} {:<25} {:12.4f} {}".format(record['scenario'], json.dumps(record['params']),
+                                                               record['metric'], record['value'], record['unit']))
+            print("%s took %.1fs" % (name, time.time() - start))
+            results.extend(scenario_results)
+    finally:
+        shutil.rmtree(directory)
+
+    output = OrderedDict([('commit', git_commit()),
+                          ('torch', torch.__version__),
+                          ('platform', platform.platform()),
+                          ('threads', torch.get_num_threads()),
+                          ('cuda', args.cuda),
+                          ('args', vars(args)),
+                          ('results', results)])
+    if args.output_path is not None:
+        with open(args.output_path, 'w') as output_file:
+            json.dump(output, output_file, indent=2)
+        print("Saved results to %s" % args.output_path)
+    if args.compare is not None:
+        with open(args.compare) as baseline_file:
+            compare_results(results, json.load(baseline_file))
@@ -0,0 +1,92 @@
+import os
+import threading
+from collections import deque
+
+import torch
+
+
+def to_cpu(obj):
+    """
+    Copies every tensor of a nested package of dicts, lists and tuples into host memory. Tensors already on the CPU
+    are copied as well, as training keeps updating the parameters and optimizer buffers in place.
+    """
+    if torch.is_tensor(obj):
+        return obj.detach().cpu() if obj.is_cuda else obj.detach().clone()
+    if isinstance(obj, dict):
+        return type(obj)((key, to_cpu(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_cpu(value) for value in obj)
+    return obj
+
+
+def save_atomic(package, file_path):
+    """
+    Saves to a temporary file next to file_path and renames it, so file_path always holds a complete checkpoint.
+    """
+    tmp_path = file_path + '.tmp'
+    torch.save(package, tmp_path)
+    os.replace(tmp_path, file_path)
+
+
+class AsyncCheckpointWriter(object):
+    def __init__(self, keep=0, asynchronous=True):
+        """
+        Saves checkpoints from a background thread. Each package is copied to host memory before save returns, the
+        training loop only waits when the previous checkpoint is still being written.
+        :param keep(default 0): Number of most recent checkpoints to keep, older ones are deleted. 0 keeps all of them
+        :param asynchronous(default True): Write on a background thread, otherwise save blocks until written
+        """
+        self.keep = keep
+        self.asynchronous = asynchronous
+        self.retained = deque()
+        self._thread = None
+        self._error = None
+
+    def save(self, package, file_path, retain=True):
+        """
+        :param package: Checkpoint to save, e.g. from DeepSpeech.serialize
+        :param file_path: Where to save the checkpoint
+        :param retain(default True): Count the checkpoint towards keep. Checkpoints that are not, like the best model,
+        are never deleted
+        """
+        self.wait()
+        package = to_cpu(package)
+        if not self.asynchronous:
+            self._write(package, file_path, retain)
+            return
+        self._thread = threading.Thread(target=self._write, args=(package, file_path, retain))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _write(self, package, file_path, retain):
+        try:
+            save_atomic(package, file_path)
+            if retain:
+                self._retain(file_path)
+        except Exception as e:
+            if not self.asynchronous:
+                raise
+            self._error = e
+
+    def _retain(self, file_path):
+        if file_path in self.retained:
+            self.retained.remove(file_path)
+        self.retained.append(file_path)
+        while 0 < self.keep < len(self.retained):
+            old_path = self.retained.popleft()
+            if os.path.isfile(old_path):
+                os.remove(old_path)
+
+    def wait(self):
+        """
+        Blocks until the checkpoint being written is saved, and raises the error of the write if it failed.
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def close(self):
+        self.wait()
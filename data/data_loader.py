@@ -1,21 +1,26 @@
+import hashlib
+import math
 import os
 import subprocess
 from tempfile import NamedTemporaryFile
 from torch.utils.data.sampler import Sampler
 
-import librosa
 import numpy as np
-import scipy.signal
 import torch
-import torchaudio
 from torch.utils.data import DataLoader
 from torch.utils.data import Dataset
 
-windows = {'hamming': scipy.signal.hamming, 'hann': scipy.signal.hann, 'blackman': scipy.signal.blackman,
-           'bartlett': scipy.signal.bartlett}
+# librosa, scipy.signal and torchaudio are slow to import, they are imported when first used
+windows = ('hamming', 'hann', 'blackman', 'bartlett')
+augment_backends = ('sox', 'numpy')
+# padding of the edges when centering the STFT frames, passed explicitly as librosa changed its default from 'reflect'
+# to 'constant' in 0.10. SpectrogramFrontend and streaming use the same padding
+stft_pad_mode = 'constant'
 
 
 def load_audio(path):
+    import torchaudio
+
     sound, _ = torchaudio.load(path)
     sound = sound.numpy()
     if len(sound.shape) > 1:
@@ -26,6 +31,10 @@ def load_audio(path):
     return sound
 
 
+def waveform_to_tensor(y):
+    return torch.from_numpy(np.clip(np.round(y), -32768, 32767).astype(np.int16))
+
+
 class AudioParser(object):
     def parse_transcript(self, transcript_path):
         """
@@ -42,25 +51,81 @@ class AudioParser(object):
         raise NotImplementedError
 
 
+class NoiseBank(object):
+    def __init__(self, paths, sample_rate=16000):
+        """
+        Holds every noise file resampled to sample_rate in a single float32 buffer placed in shared memory, so it is
+        loaded once and shared by all data loader workers. Clip i is buffer[offsets[i]:offsets[i] + lengths[i]].
+        :param paths: Noise files to load
+        :param sample_rate: Sample rate to resample the noise to
+        """
+        import librosa
+
+        clips = [librosa.load(path, sr=sample_rate, mono=True)[0] for path in paths]
+        self.lengths = np.array([len(clip) for clip in clips], dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(self.lengths)[:-1])).astype(np.int64)
+        self.buffer = torch.FloatTensor(int(self.lengths.sum())).share_memory_()
+        samples = self.buffer.numpy()
+        for offset, clip in zip(self.offsets, clips):
+            samples[offset:offset + len(clip)] = clip
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def crop(self, index, length):
+        """
+        :return: A random window of the given length from noise clip index, repeated if the clip is too short
+        """
+        clip = self.buffer.numpy()[self.offsets[index]:self.offsets[index] + self.lengths[index]]
+        if len(clip) < length:
+            return np.resize(clip, length)
+        start = np.random.randint(0, len(clip) - length + 1)
+        return clip[start:start + length]
+
+
+_noise_banks = {}
+
+
+def get_noise_bank(path, sample_rate):
+    """
+    Returns the noise bank for a directory, loading it on first use. Datasets sharing a noise directory share a bank.
+    """
+    import librosa
+
+    key = (os.path.abspath(path), sample_rate)
+    if key not in _noise_banks:
+        _noise_banks[key] = NoiseBank(librosa.util.find_files(path), sample_rate)
+    return _noise_banks[key]
+
+
 class NoiseInjection(object):
     def __init__(self,
                  path=None,
                  sample_rate=16000,
-                 noise_levels=(0, 0.5)):
+                 noise_levels=(0, 0.5),
+                 preload=False):
         """
         Adds noise to an input signal with specific SNR. Higher the noise level, the more noise added.
         Modified code from https://github.com/willfrey/audio/blob/master/torchaudio/transforms.py
+        :param preload(default False): Load all noise into a shared NoiseBank up front instead of cropping the noise
+        files with sox for every sample
         """
+        import librosa
+
         if not os.path.exists(path):
             print("Directory doesn't exist: {}".format(path))
             raise IOError
         self.paths = path is not None and librosa.util.find_files(path)
         self.sample_rate = sample_rate
         self.noise_levels = noise_levels
+        self.noise_bank = get_noise_bank(path, sample_rate) if preload else None
 
     def inject_noise(self, data):
-        noise_path = np.random.choice(self.paths)
         noise_level = np.random.uniform(*self.noise_levels)
+        if self.noise_bank is not None:
+            noise_dst = self.noise_bank.crop(np.random.randint(len(self.noise_bank)), len(data))
+            return self.mix(data, noise_dst, noise_level)
+        noise_path = np.random.choice(self.paths)
         return self.inject_noise_sample(data, noise_path, noise_level)
 
     def inject_noise_sample(self, data, noise_path, noise_level):
@@ -70,50 +135,161 @@ class NoiseInjection(object):
         noise_end = noise_start + data_len
         noise_dst = audio_with_sox(noise_path, self.sample_rate, noise_start, noise_end)
         assert len(data) == len(noise_dst)
+        return self.mix(data, noise_dst, noise_level)
+
+    @staticmethod
+    def mix(data, noise_dst, noise_level):
         noise_energy = np.sqrt(noise_dst.dot(noise_dst) / noise_dst.size)
         data_energy = np.sqrt(data.dot(data) / data.size)
         data += noise_level * noise_dst * data_energy / noise_energy
         return data
 
 
+class FeatureCache(object):
+    def __init__(self, cache_dir, audio_conf):
+        """
+        On-disk cache of log-magnitude spectrograms. Entries are keyed by the audio path, its modification time and
+        the audio_conf parameters that affect the STFT, so editing a file or changing the window invalidates them.
+        :param cache_dir: Directory to store the cached features in, created if missing
+        :param audio_conf: Dictionary containing the sample rate, window and the window length/stride in seconds
+        """
+        self.cache_dir = cache_dir
+        self.conf_key = '{sample_rate}:{window_size}:{window_stride}:{window}:{pad_mode}'.format(
+            pad_mode=stft_pad_mode, **audio_conf)
+        if not os.path.exists(cache_dir):
+            try:
+                os.makedirs(cache_dir)
+            except OSError:
+                if not os.path.isdir(cache_dir):  # another process may have created it first
+                    raise
+
+    def _entry_path(self, audio_path):
+        audio_path = os.path.abspath(audio_path)
+        key = '{}:{}:{}'.format(audio_path, os.path.getmtime(audio_path), self.conf_key)
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + '.npy')
+
+    def get(self, audio_path):
+        """
+        :return: Cached spectrogram as a numpy array, or None if there is no valid entry
+        """
+        entry_path = self._entry_path(audio_path)
+        if not os.path.exists(entry_path):
+            return None
+        try:
+            return np.load(entry_path)
+        except (IOError, ValueError):
+            return None  # truncated or corrupt entry, recompute it
+
+    def put(self, audio_path, spect):
+        entry_path = self._entry_path(audio_path)
+        entry_dir = os.path.dirname(entry_path)
+        if not os.path.exists(entry_dir):
+            try:
+                os.makedirs(entry_dir)
+            except OSError:
+                if not os.path.isdir(entry_dir):
+                    raise
+        # write to a temporary file first so concurrent loader workers never read a partial entry
+        tmp_path = '{}.{}.tmp'.format(entry_path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            np.save(f, spect)
+        os.rename(tmp_path, entry_path)
+
+
 class SpectrogramParser(AudioParser):
-    def __init__(self, audio_conf, normalize=False, augment=False):
+    def __init__(self, audio_conf, normalize=False, augment=False, feature_cache_dir=None, augment_backend='sox'):
         """
         Parses audio file into spectrogram with optional normalization and various augmentations
         :param audio_conf: Dictionary containing the sample rate, window and the window length/stride in seconds
         :param normalize(default False):  Apply standard mean and deviation normalization to audio tensor
         :param augment(default False):  Apply random tempo and gain perturbations
+        :param feature_cache_dir(default None): Directory to cache spectrograms in. Only used for samples that have
+        no random augmentation or noise applied to them
+        :param augment_backend(default sox): 'sox' to augment through the sox utility, 'numpy' to augment the
+        loaded audio in process
         """
+        if augment_backend not in augment_backends:
+            raise ValueError("augment_backend should be one of {}".format(', '.join(augment_backends)))
         super(SpectrogramParser, self).__init__()
         self.window_stride = audio_conf['window_stride']
         self.window_size = audio_conf['window_size']
         self.sample_rate = audio_conf['sample_rate']
-        self.window = windows.get(audio_conf['window'], windows['hamming'])
+        self.window = audio_conf['window'] if audio_conf['window'] in windows else 'hamming'
         self.normalize = normalize
         self.augment = augment
-        self.noiseInjector = NoiseInjection(audio_conf['noise_dir'], self.sample_rate,
-                                            audio_conf['noise_levels']) if audio_conf.get(
+        self.augment_backend = augment_backend
+        self.noiseInjector = NoiseInjection(audio_conf['noise_dir'], self.sample_rate, audio_conf['noise_levels'],
+                                            audio_conf.get('noise_bank', False)) if audio_conf.get(
             'noise_dir') is not None else None
         self.noise_prob = audio_conf.get('noise_prob')
+        self.feature_cache = FeatureCache(feature_cache_dir, audio_conf) if feature_cache_dir else None
 
     def parse_audio(self, audio_path):
-        if self.augment:
+        add_noise = self.noiseInjector is not None and np.random.binomial(1, self.noise_prob)
+        use_cache = self.feature_cache is not None and not self.augment and not add_noise
+        spect = self.feature_cache.get(audio_path) if use_cache else None
+        if spect is None:
+            spect = self.log_spectrogram(self.load_augmented_audio(audio_path, add_noise))
+            if use_cache:
+                self.feature_cache.put(audio_path, spect)
+        return self.to_tensor(spect)
+
+    def get_num_frames(self, duration):
+        """
+        :return: Number of spectrogram frames of audio with the given duration in seconds
+        """
+        return int(duration * self.sample_rate) // int(self.sample_rate * self.window_stride) + 1
+
+    def parse_waveform(self, audio_path):
+        """
+        Loads the audio with the same augmentation and noise as parse_audio, but leaves the spectrogram to be
+        computed later on a whole batch by model.SpectrogramFrontend.
+        :return: Audio samples as a ShortTensor, load_audio returns samples in the int16 range
+        """
+        add_noise = self.noiseInjector is not None and np.random.binomial(1, self.noise_prob)
+        return waveform_to_tensor(self.load_augmented_audio(audio_path, add_noise))
+
+    def load_augmented_audio(self, audio_path, add_noise=False):
+        if self.augment and self.augment_backend == 'sox':
             y = load_randomly_augmented_audio(audio_path, self.sample_rate)
+        elif self.augment:
+            y = randomly_augment_audio(load_audio(audio_path), self.sample_rate)
         else:
             y = load_audio(audio_path)
-        if self.noiseInjector:
-            add_noise = np.random.binomial(1, self.noise_prob)
-            if add_noise:
-                y = self.noiseInjector.inject_noise(y)
+        if add_noise:
+            y = self.noiseInjector.inject_noise(y)
+        return y
+
+    def parse_audio_data(self, y):
+        """
+        :param y: Audio samples already loaded into memory
+        :return: Spectrogram in training/testing format
+        """
+        return self.to_tensor(self.log_spectrogram(y))
+
+    def log_spectrogram(self, y):
+        """
+        :param y: Audio samples
+        :return: Unnormalized log(1 + |STFT|) spectrogram as a freq x time numpy array
+        """
+        import librosa
+        import scipy.signal
+
         n_fft = int(self.sample_rate * self.window_size)
         win_length = n_fft
         hop_length = int(self.sample_rate * self.window_stride)
+        # a symmetric window, as given by calling scipy.signal.hamming etc.
+        window = scipy.signal.get_window(self.window, win_length, fftbins=False)
         # STFT
         D = librosa.stft(y, n_fft=n_fft, hop_length=hop_length,
-                         win_length=win_length, window=self.window)
+                         win_length=win_length, window=window, pad_mode=stft_pad_mode)
         spect, phase = librosa.magphase(D)
         # S = log(S+1)
         spect = np.log1p(spect)
+        return spect.astype(np.float32)
+
+    def to_tensor(self, spect):
         spect = torch.FloatTensor(spect)
         if self.normalize:
             mean = spect.mean()
@@ -128,7 +304,8 @@ class SpectrogramParser(AudioParser):
 
 
 class SpectrogramDataset(Dataset, SpectrogramParser):
-    def __init__(self, audio_conf, manifest_filepath, labels, normalize=False, augment=False):
+    def __init__(self, audio_conf, manifest_filepath, labels, normalize=False, augment=False, feature_cache_dir=None,
+                 augment_backend='sox', raw_audio=False):
         """
         Dataset that loads tensors via a csv containing file paths to audio files and transcripts separated by
         a comma. Each new line is a different sample. Example below:
@@ -141,19 +318,25 @@ class SpectrogramDataset(Dataset, SpectrogramParser):
         :param labels: String containing all the possible characters to map to
         :param normalize: Apply standard mean and deviation normalization to audio tensor
         :param augment(default False):  Apply random tempo and gain perturbations
+        :param feature_cache_dir(default None): Directory to cache spectrograms in between epochs
+        :param augment_backend(default sox): Augment with the sox utility ('sox') or in process ('numpy')
+        :param raw_audio(default False): Return int16 audio instead of spectrograms, for model.SpectrogramFrontend
         """
         with open(manifest_filepath) as f:
             ids = f.readlines()
         ids = [x.strip().split(',') for x in ids]
         self.ids = ids
         self.size = len(ids)
+        # manifests created by data/utils.py store the duration of each sample after the paths
+        self.durations = [float(x[2]) for x in ids] if ids and all(len(x) > 2 for x in ids) else None
         self.labels_map = dict([(labels[i], i) for i in range(len(labels))])
-        super(SpectrogramDataset, self).__init__(audio_conf, normalize, augment)
+        self.raw_audio = raw_audio
+        super(SpectrogramDataset, self).__init__(audio_conf, normalize, augment, feature_cache_dir, augment_backend)
 
     def __getitem__(self, index):
         sample = self.ids[index]
         audio_path, transcript_path = sample[0], sample[1]
-        spect = self.parse_audio(audio_path)
+        spect = self.parse_waveform(audio_path) if self.raw_audio else self.parse_audio(audio_path)
         transcript = self.parse_transcript(transcript_path)
         return spect, transcript
 
@@ -167,6 +350,25 @@ class SpectrogramDataset(Dataset, SpectrogramParser):
         return self.size
 
 
+class AudioFileDataset(Dataset, SpectrogramParser):
+    def __init__(self, audio_conf, audio_paths, normalize=False):
+        """
+        Dataset of audio files without transcripts, for transcribing them in batches with AudioDataLoader.
+        Returns each spectrogram with an empty transcript.
+        :param audio_conf: Dictionary containing the sample rate, window and the window length/stride in seconds
+        :param audio_paths: List of paths to audio files
+        :param normalize: Apply standard mean and deviation normalization to audio tensor
+        """
+        self.audio_paths = audio_paths
+        super(AudioFileDataset, self).__init__(dict(audio_conf, noise_dir=None), normalize)
+
+    def __getitem__(self, index):
+        return self.parse_audio(self.audio_paths[index]), []
+
+    def __len__(self):
+        return len(self.audio_paths)
+
+
 def _collate_fn(batch):
     def func(p):
         return p[0].size(1)
@@ -192,13 +394,31 @@ def _collate_fn(batch):
     return inputs, targets, input_percentages, target_sizes
 
 
+def _collate_waveforms_fn(batch):
+    minibatch_size = len(batch)
+    max_length = max(len(sample[0]) for sample in batch)
+    inputs = torch.zeros(minibatch_size, max_length).type_as(batch[0][0])
+    input_lengths = torch.IntTensor(minibatch_size)
+    target_sizes = torch.IntTensor(minibatch_size)
+    targets = []
+    for x in range(minibatch_size):
+        tensor, target = batch[x]
+        inputs[x].narrow(0, 0, len(tensor)).copy_(tensor)
+        input_lengths[x] = len(tensor)
+        target_sizes[x] = len(target)
+        targets.extend(target)
+    targets = torch.IntTensor(targets)
+    return inputs, targets, input_lengths, target_sizes
+
+
 class AudioDataLoader(DataLoader):
     def __init__(self, *args, **kwargs):
         """
-        Creates a data loader for AudioDatasets.
+        Creates a data loader for AudioDatasets. Datasets returning raw audio are padded into a batch of waveforms
+        and their lengths in samples instead of spectrograms and input percentages.
         """
         super(AudioDataLoader, self).__init__(*args, **kwargs)
-        self.collate_fn = _collate_fn
+        self.collate_fn = _collate_waveforms_fn if getattr(self.dataset, 'raw_audio', False) else _collate_fn
 
 
 class BucketingSampler(Sampler):
@@ -210,17 +430,114 @@ class BucketingSampler(Sampler):
         self.data_source = data_source
         ids = list(range(0, len(data_source)))
         self.bins = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+        self.ordered_bins = list(self.bins)
+        self.start_iter = 0
 
     def __iter__(self):
-        for ids in self.bins:
+        start_iter, self.start_iter = self.start_iter, 0
+        for ids in self.bins[start_iter:]:
             np.random.shuffle(ids)
             yield ids
 
     def __len__(self):
         return len(self.bins)
 
-    def shuffle(self):
-        np.random.shuffle(self.bins)
+    def set_start_iter(self, start_iter):
+        """
+        Skips the first start_iter batches of the next epoch, to resume an epoch from a checkpoint.
+        """
+        self.start_iter = start_iter
+
+    def shuffle(self, epoch=None):
+        """
+        :param epoch(default None): If given, the batch order only depends on the epoch, so a resumed run visits the
+        batches of an epoch in the same order as the original run
+        """
+        if epoch is None:
+            np.random.shuffle(self.bins)
+        else:
+            order = np.random.RandomState(epoch).permutation(len(self.ordered_bins))
+            self.bins = [self.ordered_bins[i] for i in order]
+
+
+class DynamicBucketingSampler(BucketingSampler):
+    def __init__(self, data_source, max_frames):
+        """
+        Samples batches of varying size, with as many samples as fit into a budget of spectrogram frames. Batches are
+        padded to their longest sample, so a batch costs its size times the frames of that sample. Short utterances
+        are batched together in larger numbers than long ones and every batch does a similar amount of work.
+        Samples are taken in dataset order, which should be sorted by duration as created by data/utils.py.
+        :param data_source: Dataset with the duration of every sample in a durations attribute
+        :param max_frames: Maximum number of padded spectrogram frames per batch. Samples longer than this form a batch
+        of their own
+        """
+        super(DynamicBucketingSampler, self).__init__(data_source)
+        durations = getattr(data_source, 'durations', None)
+        if durations is None:
+            raise ValueError("DynamicBucketingSampler needs a manifest containing durations, "
+                             "recreate it with data/utils.py create_manifest")
+        self.bins = []
+        batch, longest = [], 0
+        for index, duration in enumerate(durations):
+            frames = data_source.get_num_frames(duration)
+            if batch and (len(batch) + 1) * max(longest, frames) > max_frames:
+                self.bins.append(batch)
+                batch, longest = [], 0
+            batch.append(index)
+            longest = max(longest, frames)
+        if batch:
+            self.bins.append(batch)
+        self.ordered_bins = list(self.bins)
+
+
+class DistributedBucketingSampler(Sampler):
+    def __init__(self, sampler, num_replicas=None, rank=None, pad=True):
+        """
+        Shards the batches of a BucketingSampler or DynamicBucketingSampler between distributed processes. Every
+        process builds the same batches and takes every num_replicas-th one, starting at its rank.
+        :param sampler: Sampler whose batches are sharded
+        :param num_replicas(default None): Number of processes, defaults to the distributed world size
+        :param rank(default None): Rank of this process, defaults to the distributed rank
+        :param pad(default True): Repeat batches so every process gets the same number of them. Required for
+        training, where processes synchronise every step; evaluation can leave it off to visit each sample once
+        """
+        super(DistributedBucketingSampler, self).__init__(sampler.data_source)
+        if num_replicas is None or rank is None:
+            import torch.distributed as dist
+
+            num_replicas = dist.get_world_size() if num_replicas is None else num_replicas
+            rank = dist.get_rank() if rank is None else rank
+        self.sampler = sampler
+        self.data_source = sampler.data_source
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.pad = pad
+        self.start_iter = 0
+
+    def _local_bins(self):
+        bins = self.sampler.bins
+        if self.pad:
+            num_bins = int(math.ceil(len(bins) / float(self.num_replicas))) * self.num_replicas
+            bins = (bins * int(math.ceil(num_bins / float(max(len(bins), 1)))))[:num_bins]
+        return bins[self.rank::self.num_replicas]
+
+    def __iter__(self):
+        start_iter, self.start_iter = self.start_iter, 0
+        for ids in self._local_bins()[start_iter:]:
+            np.random.shuffle(ids)
+            yield ids
+
+    def __len__(self):
+        return len(self._local_bins())
+
+    def set_start_iter(self, start_iter):
+        self.start_iter = start_iter
+
+    def shuffle(self, epoch):
+        """
+        Shuffling depends only on the epoch, so every process ends up with the same batch order.
+        """
+        self.sampler.shuffle(epoch)
 
 
 def get_audio_length(path):
@@ -257,16 +574,71 @@ def augment_audio_with_sox(path, sample_rate, tempo, gain):
         return y
 
 
-def load_randomly_augmented_audio(path, sample_rate=16000, tempo_range=(0.85, 1.15),
-                                  gain_range=(-6, 8)):
+def change_tempo(y, sample_rate, tempo, frame_size=0.032, search_size=0.008):
     """
-    Picks tempo and gain uniformly, applies it to the utterance by using sox utility.
-    Returns the augmented utterance.
+    Changes the tempo of the audio without changing its pitch, like the sox tempo effect, using a
+    waveform similarity overlap-add (WSOLA). Frames are taken every frame_size / 2 * tempo samples of the input and
+    overlap-added every frame_size / 2 samples of the output. Each frame is shifted by up to search_size seconds to
+    best match the natural continuation of the previous frame. The search is done for all frames at once with
+    batched FFT cross-correlations, comparing against the continuation of the unshifted previous frame.
+    """
+    frame_length = 2 * int(sample_rate * frame_size / 2)
+    hop = frame_length // 2
+    delta = int(sample_rate * search_size)
+    output_length = int(round(len(y) / tempo))
+    num_frames = output_length // hop + 1
+    positions = np.round(np.arange(num_frames) * hop * tempo).astype(np.int64)
+    # pad so every candidate and continuation window is in range, positions are shifted by delta
+    y = np.pad(y.astype(np.float32), (delta, delta + frame_length + hop + positions[-1] - len(y) + 1), 'constant')
+
+    candidate_length = frame_length + 2 * delta
+    candidates = y[positions[:, None] + np.arange(candidate_length)]  # frame k starts at positions[k] - delta
+    continuations = y[positions[:-1, None] + delta + hop + np.arange(frame_length)]
+    fft_size = 1 << int(np.ceil(np.log2(candidate_length + frame_length)))
+    correlation = np.fft.irfft(np.fft.rfft(candidates[1:], fft_size) *
+                               np.conj(np.fft.rfft(continuations, fft_size)), fft_size)[:, :2 * delta + 1]
+    shifts = np.concatenate(([delta], np.argmax(correlation, axis=1)))
+
+    window = np.hanning(frame_length + 1)[:-1].astype(np.float32)  # periodic, sums to one at 50% overlap
+    frames = candidates[np.arange(num_frames)[:, None], shifts[:, None] + np.arange(frame_length)] * window
+    output = np.zeros((num_frames + 1, hop), dtype=np.float32)
+    output[:-1] += frames[:, :hop]
+    output[1:] += frames[:, hop:]
+    return output.reshape(-1)[:output_length]
+
+
+def augment_audio(y, sample_rate, tempo, gain):
     """
+    Changes tempo and gain of audio that is already loaded, without leaving the process.
+    """
+    y = change_tempo(y, sample_rate, tempo)
+    return y * np.float32(10 ** (gain / 20.))
+
+
+def random_augment_parameters(tempo_range=(0.85, 1.15), gain_range=(-6, 8)):
     low_tempo, high_tempo = tempo_range
     tempo_value = np.random.uniform(low=low_tempo, high=high_tempo)
     low_gain, high_gain = gain_range
     gain_value = np.random.uniform(low=low_gain, high=high_gain)
+    return tempo_value, gain_value
+
+
+def randomly_augment_audio(y, sample_rate=16000, tempo_range=(0.85, 1.15), gain_range=(-6, 8)):
+    """
+    Picks tempo and gain uniformly, applies it to the loaded utterance in process.
+    Returns the augmented utterance.
+    """
+    tempo_value, gain_value = random_augment_parameters(tempo_range, gain_range)
+    return augment_audio(y, sample_rate, tempo=tempo_value, gain=gain_value)
+
+
+def load_randomly_augmented_audio(path, sample_rate=16000, tempo_range=(0.85, 1.15),
+                                  gain_range=(-6, 8)):
+    """
+    Picks tempo and gain uniformly, applies it to the utterance by using sox utility.
+    Returns the augmented utterance.
+    """
+    tempo_value, gain_value = random_augment_parameters(tempo_range, gain_range)
     audio = augment_audio_with_sox(path=path, sample_rate=sample_rate,
                                    tempo=tempo_value, gain=gain_value)
     return audio
@@ -5,7 +5,7 @@ import io
 import os
 
 from tqdm import tqdm
-from utils import order_and_prune_files
+from utils import order_and_prune_files, manifest_line, DurationIndex
 
 parser = argparse.ArgumentParser(description='Merges all manifest CSV files in specified folder.')
 parser.add_argument('--merge-dir', default='manifests/', help='Path to all manifest files you want to merge')
@@ -14,6 +14,9 @@ parser.add_argument('--min-duration', default=1, type=int,
 parser.add_argument('--max-duration', default=15, type=int,
                     help='Prunes any samples longer than the max duration (given in seconds, default 15)')
 parser.add_argument('--output-path', default='merged_manifest.csv', help='Output path to merged manifest')
+parser.add_argument('--duration-index', default=None,
+                    help='Persistent duration index to reuse, durations of manifests without them are added to it')
+parser.add_argument('--num-workers', default=None, type=int, help='Number of processes used to read audio headers')
 
 args = parser.parse_args()
 
@@ -22,10 +25,18 @@ for file in os.listdir(args.merge_dir):
     if file.endswith(".csv"):
         with open(os.path.join(args.merge_dir, file), 'r') as fh:
             file_paths += fh.readlines()
-file_paths = [file_path.split(',')[0] for file_path in file_paths]
-file_paths = order_and_prune_files(file_paths, args.min_duration, args.max_duration)
+rows = [file_path.strip().split(',') for file_path in file_paths if file_path.strip()]
+transcript_paths = dict((row[0], row[1]) for row in rows)
+duration_index = DurationIndex(args.duration_index)
+for row in rows:
+    if len(row) >= 4:  # manifests with durations never need their audio read again
+        duration_index.set_duration(row[0], float(row[2]), int(row[3]))
+duration_index.update([row[0] for row in rows if len(row) < 4], args.num_workers)
+file_paths = order_and_prune_files([row[0] for row in rows], args.min_duration, args.max_duration, duration_index)
 with io.FileIO(args.output_path, "w") as file:
     for wav_path in tqdm(file_paths, total=len(file_paths)):
-        transcript_path = wav_path.replace('/wav/', '/txt/').replace('.wav', '.txt')
-        sample = os.path.abspath(wav_path) + ',' + os.path.abspath(transcript_path) + '\n'
+        duration, num_samples = duration_index.get(wav_path)
+        sample = manifest_line(os.path.abspath(wav_path), os.path.abspath(transcript_paths[wav_path]), duration,
+                               num_samples)
         file.write(sample.encode('utf-8'))
+duration_index.save()
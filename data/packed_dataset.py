@@ -0,0 +1,155 @@
+import json
+import os
+
+import numpy as np
+from torch.utils.data import Dataset
+
+from data.data_loader import SpectrogramDataset, SpectrogramParser, load_audio, randomly_augment_audio, \
+    waveform_to_tensor
+
+META_FILE = 'meta.json'
+INDEX_FILE = 'index.npy'
+# every index row holds: shard id, offset/length into the shard data, offset/length into the shard labels
+
+
+def _shard_paths(packed_dir, shard):
+    prefix = os.path.join(packed_dir, 'shard_%05d' % shard)
+    return prefix + '.data', prefix + '.labels'
+
+
+def is_packed_dataset(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+
+def pack_manifest(manifest_filepath, packed_dir, labels, audio_conf, features=False, shard_size=1 << 30):
+    """
+    Packs every sample of a manifest into a few large shard files that PackedSpectrogramDataset can memory-map.
+    Each shard holds the concatenated audio (int16 PCM) or unnormalized spectrograms (float32, time major) plus
+    a file of concatenated label indices. A single index maps every sample to its slices, keeping manifest order.
+    :param manifest_filepath: Path to manifest csv
+    :param packed_dir: Directory to write the shards, index and metadata to
+    :param labels: String containing all the possible characters to map to
+    :param audio_conf: Dictionary containing the sample rate, window and the window length/stride in seconds
+    :param features(default False): Store spectrograms instead of audio, skipping the STFT when training
+    :param shard_size(default 1GB): Size in bytes after which a new shard is started
+    """
+    if not os.path.exists(packed_dir):
+        os.makedirs(packed_dir)
+    # the packed data has to be deterministic, never apply noise or augmentation while packing
+    audio_conf = dict(audio_conf, noise_dir=None)
+    dataset = SpectrogramDataset(audio_conf=audio_conf, manifest_filepath=manifest_filepath, labels=labels,
+                                 normalize=False, augment=False)
+    dtype = np.float32 if features else np.int16
+    index = np.zeros((len(dataset), 5), dtype=np.int64)
+    shard, shard_bytes, data_offset, label_offset = 0, 0, 0, 0
+    data_file, label_file = [open(path, 'wb') for path in _shard_paths(packed_dir, shard)]
+    freq_size = None
+    for i, (audio_path, transcript_path) in enumerate(sample[:2] for sample in dataset.ids):
+        if shard_bytes >= shard_size:
+            data_file.close()
+            label_file.close()
+            shard, shard_bytes, data_offset, label_offset = shard + 1, 0, 0, 0
+            data_file, label_file = [open(path, 'wb') for path in _shard_paths(packed_dir, shard)]
+        if features:
+            data = dataset.log_spectrogram(load_audio(audio_path)).T  # time major so a sample is a row slice
+            freq_size = data.shape[1]
+        else:
+            data = np.clip(np.round(load_audio(audio_path)), -32768, 32767)
+        data = np.ascontiguousarray(data, dtype=dtype)
+        transcript = np.asarray(dataset.parse_transcript(transcript_path), dtype=np.int32)
+        data_file.write(data.tobytes())
+        label_file.write(transcript.tobytes())
+        index[i] = (shard, data_offset, len(data), label_offset, len(transcript))
+        shard_bytes += data.nbytes
+        data_offset += len(data)  # samples for pcm, frames for features
+        label_offset += len(transcript)
+    data_file.close()
+    label_file.close()
+    np.save(os.path.join(packed_dir, INDEX_FILE), index)
+    meta = {
+        'format': 'features' if features else 'pcm',
+        'num_shards': shard + 1,
+        'num_samples': len(dataset),
+        'freq_size': freq_size,
+        'labels': labels,
+        'audio_conf': audio_conf
+    }
+    with open(os.path.join(packed_dir, META_FILE), 'w') as meta_file:
+        json.dump(meta, meta_file)
+
+
+class PackedSpectrogramDataset(Dataset, SpectrogramParser):
+    def __init__(self, audio_conf, packed_dir, labels, normalize=False, augment=False, raw_audio=False):
+        """
+        Dataset that reads samples from the shards written by pack_manifest. Shards are memory-mapped lazily in
+        each loader worker and samples are sliced out of them, so no file is opened or stat'ed per sample.
+        Returns the same (spectrogram, transcript) pairs as SpectrogramDataset and can be used with
+        AudioDataLoader and BucketingSampler in the same way.
+        :param audio_conf: Dictionary containing the sample rate, window and the window length/stride in seconds
+        :param packed_dir: Directory created by pack_manifest
+        :param labels: String containing all the possible characters to map to
+        :param normalize: Apply standard mean and deviation normalization to audio tensor
+        :param augment(default False):  Apply random tempo and gain perturbations, always done in process
+        :param raw_audio(default False): Return int16 audio instead of spectrograms, for model.SpectrogramFrontend
+        """
+        with open(os.path.join(packed_dir, META_FILE)) as meta_file:
+            self.meta = json.load(meta_file)
+        if self.meta['labels'] != labels:
+            raise ValueError("Dataset {} was packed with labels {}".format(packed_dir, self.meta['labels']))
+        self.features = self.meta['format'] == 'features'
+        if self.features:
+            packed_conf = self.meta['audio_conf']
+            for key in ('sample_rate', 'window_size', 'window_stride', 'window'):
+                if packed_conf[key] != audio_conf[key]:
+                    raise ValueError("Features in {} were computed with {}={}, model expects {}".format(
+                        packed_dir, key, packed_conf[key], audio_conf[key]))
+            if augment or raw_audio or audio_conf.get('noise_dir') is not None:
+                raise ValueError("Augmentation, noise injection and raw audio need a dataset packed as pcm")
+        self.packed_dir = packed_dir
+        self.index = np.load(os.path.join(packed_dir, INDEX_FILE))
+        self.size = len(self.index)
+        lengths = self.index[:, 2]
+        if self.features:
+            self.durations = ((lengths - 1) * audio_conf['window_stride']).tolist()
+        else:
+            self.durations = (lengths / float(audio_conf['sample_rate'])).tolist()
+        self.raw_audio = raw_audio
+        self._shards = {}
+        super(PackedSpectrogramDataset, self).__init__(audio_conf, normalize, augment, augment_backend='numpy')
+
+    def __getstate__(self):
+        # memory maps are reopened by each worker instead of being pickled as full arrays
+        state = self.__dict__.copy()
+        state['_shards'] = {}
+        return state
+
+    def _get_shard(self, shard):
+        if shard not in self._shards:
+            data_path, label_path = _shard_paths(self.packed_dir, shard)
+            dtype = np.float32 if self.features else np.int16
+            data = np.memmap(data_path, dtype=dtype, mode='r') if os.path.getsize(data_path) else np.zeros(0, dtype)
+            if self.features:
+                data = data.reshape(-1, self.meta['freq_size'])
+            labels = np.memmap(label_path, dtype=np.int32, mode='r') if os.path.getsize(label_path) else \
+                np.zeros(0, np.int32)
+            self._shards[shard] = data, labels
+        return self._shards[shard]
+
+    def __getitem__(self, index):
+        shard, data_offset, data_length, label_offset, label_length = self.index[index]
+        data, labels = self._get_shard(shard)
+        data = data[data_offset:data_offset + data_length]
+        if self.features:
+            spect = self.to_tensor(np.array(data.T))  # normalization is in place, copy out of the read-only map
+        else:
+            y = data.astype(np.float32)
+            if self.augment:
+                y = randomly_augment_audio(y, self.sample_rate)
+            if self.noiseInjector is not None and np.random.binomial(1, self.noise_prob):
+                y = self.noiseInjector.inject_noise(y)
+            spect = waveform_to_tensor(y) if self.raw_audio else self.parse_audio_data(y)
+        transcript = labels[label_offset:label_offset + label_length].tolist()
+        return spect, transcript
+
+    def __len__(self):
+        return self.size
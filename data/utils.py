@@ -3,27 +3,43 @@ from __future__ import print_function
 import fnmatch
 import io
 import os
+import wave
+from multiprocessing import Pool
+
 from tqdm import tqdm
 import subprocess
 
 
-def create_manifest(data_path, output_path, min_duration=None, max_duration=None):
+def create_manifest(data_path, output_path, min_duration=None, max_duration=None, duration_index_path=None,
+                    num_workers=None):
+    """
+    Writes a manifest of all wav files under data_path, sorted by duration. Each line holds the audio and transcript
+    paths followed by the duration in seconds, the number of samples and the length of the transcript.
+    :param duration_index_path(default None): Persistent DurationIndex to read durations from and add new files to
+    :param num_workers(default None): Processes used to read audio headers, defaults to the number of cpus
+    """
     file_paths = [os.path.join(dirpath, f)
                   for dirpath, dirnames, files in os.walk(data_path)
                   for f in fnmatch.filter(files, '*.wav')]
-    file_paths = order_and_prune_files(file_paths, min_duration, max_duration)
+    duration_index = DurationIndex(duration_index_path)
+    duration_index.update(file_paths, num_workers)
+    file_paths = order_and_prune_files(file_paths, min_duration, max_duration, duration_index)
     with io.FileIO(output_path, "w") as file:
         for wav_path in tqdm(file_paths, total=len(file_paths)):
             transcript_path = wav_path.replace('/wav/', '/txt/').replace('.wav', '.txt')
-            sample = os.path.abspath(wav_path) + ',' + os.path.abspath(transcript_path) + '\n'
+            duration, num_samples = duration_index.get(wav_path)
+            sample = manifest_line(os.path.abspath(wav_path), os.path.abspath(transcript_path), duration, num_samples)
             file.write(sample.encode('utf-8'))
+    duration_index.save()
     print('\n')
 
 
-def order_and_prune_files(file_paths, min_duration, max_duration):
+def order_and_prune_files(file_paths, min_duration, max_duration, duration_index=None):
     print("Sorting manifests...")
-    duration_file_paths = [(path, float(subprocess.check_output(
-        ['soxi -D \"%s\"' % path.strip()], shell=True))) for path in file_paths]
+    if duration_index is None:
+        duration_index = DurationIndex()
+        duration_index.update(file_paths)
+    duration_file_paths = [(path, duration_index.get(path)[0]) for path in file_paths]
     if min_duration and max_duration:
         print("Pruning manifests between %d and %d seconds" % (min_duration, max_duration))
         duration_file_paths = [(path, duration) for path, duration in duration_file_paths if
@@ -34,3 +50,115 @@ def order_and_prune_files(file_paths, min_duration, max_duration):
 
     duration_file_paths.sort(key=func)
     return [x[0] for x in duration_file_paths]  # Remove durations
+
+
+def manifest_line(wav_path, transcript_path, duration, num_samples):
+    with io.open(transcript_path, encoding='utf-8') as transcript_file:
+        transcript_length = len(transcript_file.read().replace('\n', ''))
+    return '%s,%s,%.4f,%d,%d\n' % (wav_path, transcript_path, duration, num_samples, transcript_length)
+
+
+def read_audio_info(path):
+    """
+    Reads the duration, number of samples and sample rate of an audio file from its header.
+    Falls back to soxi for files the wave module can't parse (compressed or non PCM audio).
+    """
+    path = path.strip()
+    try:
+        audio_file = wave.open(path, 'rb')
+        try:
+            num_samples, sample_rate = audio_file.getnframes(), audio_file.getframerate()
+        finally:
+            audio_file.close()
+    except (wave.Error, EOFError):
+        num_samples = int(subprocess.check_output(['soxi', '-s', path]))
+        sample_rate = int(float(subprocess.check_output(['soxi', '-r', path])))
+    return num_samples / float(sample_rate), num_samples, sample_rate
+
+
+def _stat_audio_info(path):
+    stat = os.stat(path)
+    return (path, stat.st_mtime, stat.st_size) + read_audio_info(path)
+
+
+class DurationIndex(object):
+    def __init__(self, index_path=None):
+        """
+        Cache of audio durations, optionally persisted as a csv of path, mtime, size, duration, number of samples and
+        sample rate. Entries are only trusted while the file's mtime and size are unchanged, so an index can be reused
+        whenever manifests are rebuilt or merged and only new or modified files have their headers read.
+        :param index_path(default None): Path of the csv to load from and save to, None keeps the index in memory
+        """
+        self.index_path = index_path
+        self.entries = {}
+        self._checked = set()  # paths whose entry was validated against the file system by this process
+        if index_path is not None and os.path.exists(index_path):
+            with io.open(index_path, encoding='utf-8') as index_file:
+                for line in index_file:
+                    path, mtime, size, duration, num_samples, sample_rate = line.rstrip('\n').rsplit(',', 5)
+                    self.entries[path] = (float(mtime), int(size), float(duration), int(num_samples),
+                                          int(sample_rate))
+
+    def _is_fresh(self, path):
+        if path in self._checked:
+            return True
+        entry = self.entries.get(path)
+        if entry is None:
+            return False
+        stat = os.stat(path)
+        return entry[0] == stat.st_mtime and entry[1] == stat.st_size
+
+    def update(self, file_paths, num_workers=None, verbose=True):
+        """
+        Reads the headers of all files that are missing or stale in the index, in parallel.
+        :param verbose(default True): Print progress, turn off to keep stdout clean
+        """
+        file_paths = [os.path.abspath(path.strip()) for path in file_paths]
+        missing = [path for path in file_paths if not self._is_fresh(path)]
+        if len(missing) == 1:
+            infos = [_stat_audio_info(missing[0])]
+        elif missing:
+            if verbose:
+                print("Reading durations of %d files..." % len(missing))
+            pool = Pool(num_workers)
+            try:
+                infos = list(tqdm(pool.imap_unordered(_stat_audio_info, missing, chunksize=64), total=len(missing),
+                                  disable=not verbose))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            infos = []
+        for path, mtime, size, duration, num_samples, sample_rate in infos:
+            self.entries[path] = (mtime, size, duration, num_samples, sample_rate)
+        self._checked.update(file_paths)
+
+    def get(self, path):
+        """
+        :return: Duration in seconds and number of samples of the file
+        """
+        path = os.path.abspath(path.strip())
+        if not self._is_fresh(path):
+            self.update([path])
+        entry = self.entries[path]
+        return entry[2], entry[3]
+
+    def set_duration(self, path, duration, num_samples):
+        """
+        Records a duration that is already known, e.g. from a manifest. It is trusted for the lifetime of this index
+        without looking at the file, but not saved since there is no mtime to validate it against later.
+        """
+        path = os.path.abspath(path.strip())
+        self.entries[path] = (None, None, duration, num_samples, None)
+        self._checked.add(path)
+
+    def save(self):
+        if self.index_path is None:
+            return
+        tmp_path = self.index_path + '.tmp'
+        with io.open(tmp_path, 'w', encoding='utf-8') as index_file:
+            for path, (mtime, size, duration, num_samples, sample_rate) in self.entries.items():
+                if mtime is None:
+                    continue
+                index_file.write(u'%s,%r,%d,%r,%d,%d\n' % (path, mtime, size, duration, num_samples, sample_rate))
+        os.rename(tmp_path, self.index_path)
@@ -15,10 +15,20 @@
 # ----------------------------------------------------------------------------
 # Modified to support pytorch Tensors
 
+import heapq
+import math
+from collections import defaultdict
+from functools import partial
+from multiprocessing import Pool
+
 import Levenshtein as Lev
+import numpy as np
 import torch
 from six.moves import xrange
 
+_NEG_INF = float('-inf')
+_kenlm_models = {}  # loaded once per process and shared by all KenLMScorers of the same model
+
 
 class Decoder(object):
     """
@@ -86,6 +96,18 @@ class Decoder(object):
         """
         raise NotImplementedError
 
+    def close(self):
+        """
+        Releases the processes of the decoder, it can't decode afterwards.
+        """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 
 class BeamCTCDecoder(Decoder):
     def __init__(self, labels, lm_path=None, alpha=0, beta=0, cutoff_top_n=40, cutoff_prob=1.0, beam_width=100,
@@ -143,9 +165,208 @@ class BeamCTCDecoder(Decoder):
         return strings, offsets
 
 
+class Scorer(object):
+    def __init__(self, alpha=0, beta=0):
+        """
+        Scores words for shallow fusion in PrefixBeamCTCDecoder. Whenever a beam completes a word the decoder adds
+        alpha * word_log_prob(words) + beta to its score. This base class has no language model and only applies the
+        word bonus beta, subclasses implement word_log_prob.
+        Scorers are pickled to the decoder's worker processes, so they should load large models lazily.
+        :param alpha(default 0): Language model weight
+        :param beta(default 0): Word bonus
+        """
+        self.alpha = alpha
+        self.beta = beta
+
+    def word_log_prob(self, words):
+        """
+        :param words: List of the words of a transcription so far
+        :return: Natural log probability of the last word given the previous ones
+        """
+        return 0.0
+
+    def __call__(self, words):
+        return self.alpha * self.word_log_prob(words) + self.beta
+
+
+class KenLMScorer(Scorer):
+    def __init__(self, lm_path, alpha=0, beta=0):
+        """
+        Scores words with a kenlm language model. The model is only loaded when the first word is scored, once per
+        process.
+        :param lm_path: Path to an arpa or binary kenlm model
+        """
+        super(KenLMScorer, self).__init__(alpha, beta)
+        self.lm_path = lm_path
+        self._sentence_scores = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_sentence_scores'] = {}
+        return state
+
+    def _sentence_score(self, words):
+        words = tuple(words)
+        if words not in self._sentence_scores:
+            if self.lm_path not in _kenlm_models:
+                try:
+                    import kenlm
+                except ImportError:
+                    raise ImportError("KenLMScorer requires the kenlm package.")
+                _kenlm_models[self.lm_path] = kenlm.Model(self.lm_path)
+            log10_score = _kenlm_models[self.lm_path].score(' '.join(words), bos=True, eos=False)
+            self._sentence_scores[words] = log10_score * math.log(10)
+        return self._sentence_scores[words]
+
+    def word_log_prob(self, words):
+        return self._sentence_score(words) - self._sentence_score(words[:-1])
+
+
+def _log_add(a, b):
+    if a < b:
+        a, b = b, a
+    if b == _NEG_INF:
+        return a
+    return a + math.log1p(math.exp(b - a))
+
+
+def _prune(probs, cutoff_top_n, cutoff_prob):
+    """
+    Returns the candidate characters of every time step as lists of (index, log probability): the cutoff_top_n most
+    likely characters, fewer if their cumulative probability reaches cutoff_prob first.
+    """
+    cutoff_top_n = min(cutoff_top_n, probs.shape[1])
+    order = np.argsort(-probs, axis=1)[:, :cutoff_top_n]
+    top_probs = probs[np.arange(len(probs))[:, None], order]
+    num_kept = np.full(len(probs), cutoff_top_n)
+    if cutoff_prob < 1.0:
+        num_kept = np.minimum(num_kept, (np.cumsum(top_probs, axis=1) < cutoff_prob).sum(1) + 1)
+    log_probs = np.log(np.maximum(top_probs, 1e-30))
+    return [list(zip(order[t, :n].tolist(), log_probs[t, :n].tolist())) for t, n in enumerate(num_kept)]
+
+
+def prefix_beam_search(probs, labels, blank_index=0, space_index=None, beam_width=100, cutoff_top_n=40,
+                       cutoff_prob=1.0, scorer=None):
+    """
+    CTC prefix beam search over the output of a single utterance, in log space.
+    :param probs: Numpy array of character probabilities of shape seq_length x output_dim
+    :param labels: String containing all the possible characters
+    :param blank_index(default 0): Index of the CTC blank
+    :param space_index(default None): Index of the character separating words, where the scorer is applied
+    :param beam_width(default 100): Number of prefixes kept after every time step
+    :param cutoff_top_n(default 40): Number of most likely characters considered per time step
+    :param cutoff_prob(default 1.0): Cumulative probability at which to stop considering characters, 1.0 disables it
+    :param scorer(default None): Scorer applied whenever a word is completed
+    :return: List of (label indices, time step of each label, score) of the best beams, best first
+    """
+    # every prefix has the log probabilities of ending in a blank and in its last character
+    beams = {(): (0.0, _NEG_INF)}
+    lm_scores = {(): 0.0}
+    offsets = {(): ()}
+
+    def words(prefix):
+        return ''.join(labels[c] for c in prefix).split()
+
+    for t, candidates in enumerate(_prune(probs, cutoff_top_n, cutoff_prob)):
+        next_beams = defaultdict(lambda: (_NEG_INF, _NEG_INF))
+        for prefix, (p_b, p_nb) in beams.items():
+            p_total = _log_add(p_b, p_nb)
+            for c, log_prob in candidates:
+                if c == blank_index:
+                    n_b, n_nb = next_beams[prefix]
+                    next_beams[prefix] = (_log_add(n_b, p_total + log_prob), n_nb)
+                    continue
+                new_prefix = prefix + (c,)
+                if new_prefix not in lm_scores:
+                    lm_score = lm_scores[prefix]
+                    if scorer is not None and c == space_index and prefix and prefix[-1] != space_index:
+                        lm_score += scorer(words(prefix))
+                    lm_scores[new_prefix] = lm_score
+                    offsets[new_prefix] = offsets[prefix] + (t,)
+                n_b, n_nb = next_beams[new_prefix]
+                if prefix and c == prefix[-1]:
+                    # a repeated character only starts a new one after a blank, otherwise it extends the last one
+                    next_beams[new_prefix] = (n_b, _log_add(n_nb, p_b + log_prob))
+                    n_b, n_nb = next_beams[prefix]
+                    next_beams[prefix] = (n_b, _log_add(n_nb, p_nb + log_prob))
+                else:
+                    next_beams[new_prefix] = (n_b, _log_add(n_nb, p_total + log_prob))
+        beams = dict(heapq.nlargest(beam_width, next_beams.items(),
+                                    key=lambda beam: _log_add(*beam[1]) + lm_scores[beam[0]]))
+        lm_scores = dict((prefix, lm_scores[prefix]) for prefix in beams)
+        offsets = dict((prefix, offsets[prefix]) for prefix in beams)
+
+    results = []
+    for prefix, (p_b, p_nb) in beams.items():
+        score = _log_add(p_b, p_nb) + lm_scores[prefix]
+        if scorer is not None and prefix and prefix[-1] != space_index:
+            score += scorer(words(prefix))  # the last word is complete as well
+        if score == _NEG_INF:
+            continue  # fewer prefixes are possible than beam_width, the impossible ones fill up the beams
+        results.append((prefix, offsets[prefix], score))
+    results.sort(key=lambda result: result[2], reverse=True)
+    return results
+
+
+class PrefixBeamCTCDecoder(Decoder):
+    def __init__(self, labels, lm_path=None, alpha=0, beta=0, cutoff_top_n=40, cutoff_prob=1.0, beam_width=100,
+                 num_processes=4, blank_index=0, scorer=None):
+        """
+        CTC prefix beam search implemented in python, a drop in replacement for BeamCTCDecoder that needs no
+        external decoder package. The utterances of a batch are decoded in parallel by a pool of processes.
+        :param lm_path(default None): Path to a kenlm language model, scored with KenLMScorer. Without it only the
+        word bonus beta is applied
+        :param scorer(default None): Scorer to use instead of the one built from lm_path, alpha and beta
+        """
+        super(PrefixBeamCTCDecoder, self).__init__(labels, blank_index)
+        if scorer is None and lm_path is not None:
+            scorer = KenLMScorer(lm_path, alpha, beta)
+        elif scorer is None and beta != 0:
+            scorer = Scorer(alpha, beta)
+        self._search = partial(prefix_beam_search, labels=labels, blank_index=blank_index,
+                               space_index=self.space_index, beam_width=beam_width, cutoff_top_n=cutoff_top_n,
+                               cutoff_prob=cutoff_prob, scorer=scorer)
+        self.num_processes = num_processes
+        self._pool = None
+
+    def decode(self, probs, sizes=None):
+        """
+        Decodes probability output with prefix beam search.
+        Arguments:
+            probs: Tensor of character probabilities, where probs[c,t]
+                            is the probability of character c at time t
+            sizes: Size of each sequence in the mini-batch
+        Returns:
+            string: sequences of the model's best guess for the transcription
+        """
+        probs = probs.cpu().transpose(0, 1).contiguous().numpy()
+        if sizes is None:
+            sizes = [probs.shape[1]] * len(probs)
+        utterances = [probs[b, :int(size)] for b, size in enumerate(sizes)]
+        if self.num_processes > 1 and len(utterances) > 1:
+            if self._pool is None:
+                self._pool = Pool(self.num_processes)
+            beams = self._pool.map(self._search, utterances)
+        else:
+            beams = [self._search(utterance) for utterance in utterances]
+
+        strings = [[''.join(self.int_to_char[c] for c in prefix) for prefix, _, _ in utterance_beams]
+                   for utterance_beams in beams]
+        offsets = [[torch.IntTensor(list(prefix_offsets)) for _, prefix_offsets, _ in utterance_beams]
+                   for utterance_beams in beams]
+        return strings, offsets
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+
 class GreedyDecoder(Decoder):
     def __init__(self, labels, blank_index=0):
         super(GreedyDecoder, self).__init__(labels, blank_index)
+        self._label_array = np.array(list(labels))
 
     def convert_to_strings(self, sequences, sizes=None, remove_repetitions=False, return_offsets=False):
         """Given a list of numeric sequences, returns the corresponding strings"""
@@ -192,6 +413,29 @@ class GreedyDecoder(Decoder):
             offsets: time step per character predicted
         """
         _, max_probs = torch.max(probs.transpose(0, 1), 2)
-        strings, offsets = self.convert_to_strings(max_probs.view(max_probs.size(0), max_probs.size(1)), sizes,
-                                                   remove_repetitions=True, return_offsets=True)
+        return self.collapse(max_probs.view(max_probs.size(0), max_probs.size(1)), sizes)
+
+    def collapse(self, sequences, sizes=None):
+        """
+        Removes repeated elements and blanks from a whole batch of label sequences at once, giving the same result as
+        convert_to_strings with remove_repetitions=True. Only the indices that are kept are mapped to characters.
+
+        Arguments:
+            sequences: Tensor of label indices of shape batch x seq_length
+            sizes(optional): Size of each sequence in the mini-batch
+        Returns:
+            strings: sequences of the model's best guess for the transcription on inputs
+            offsets: time step per character predicted
+        """
+        sequences = sequences.cpu().numpy()
+        keep = sequences != self.blank_index
+        keep[:, 1:] &= sequences[:, 1:] != sequences[:, :-1]
+        if sizes is not None:
+            keep &= np.arange(sequences.shape[1]) < np.asarray(sizes).reshape(-1, 1)
+        _, offsets = np.nonzero(keep)
+        chars = ''.join(self._label_array[sequences[keep]])
+        ends = np.cumsum(keep.sum(1))
+        starts = ends - keep.sum(1)
+        strings = [[chars[start:end]] for start, end in zip(starts, ends)]
+        offsets = [[torch.from_numpy(offsets[start:end]).int()] for start, end in zip(starts, ends)]
         return strings, offsets
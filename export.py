@@ -0,0 +1,82 @@
+from __future__ import print_function
+
+import argparse
+import json
+import time
+
+import torch
+
+from model import DeepSpeech, ExportedDeepSpeech
+
+parser = argparse.ArgumentParser(description='Exports a DeepSpeech model as a fused, traced model for inference')
+parser.add_argument('--model-path', default='models/deepspeech_final.pth',
+                    help='Path to model file created by training')
+parser.add_argument('--output-path', default='models/deepspeech_exported.pth',
+                    help='Where to save the exported model, it can be used with transcribe.py, test.py and server.py')
+parser.add_argument('--cuda', action="store_true", help='Trace the model on the GPU, to run the export on the GPU')
+parser.add_argument('--seconds', default=5, type=int, help='Length of the fake input used to trace the model')
+parser.add_argument('--tolerance', default=1e-4, type=float,
+                    help='Largest difference allowed between the output probabilities of both models')
+parser.add_argument('--runs', default=5, type=int, help='How many runs to compare the speed of both models over')
+
+
+def export_model(model, seconds=5, cuda=False):
+    """
+    Fuses the batch norms of the model and traces it.
+    :param model: DeepSpeech model
+    :param seconds(default 5): Length of the fake input used to trace the model, any length can be run afterwards
+    :param cuda(default False): Trace on the GPU
+    :return: The traced model and the metadata to save with it
+    """
+    fused = DeepSpeech.fuse(model)
+    fused = fused.cuda() if cuda else fused.cpu()
+    audio_conf = DeepSpeech.get_audio_conf(model)
+    freq_size = int(audio_conf.get('sample_rate', 16000) * audio_conf.get('window_size', .02)) // 2 + 1
+    inputs = torch.randn(1, 1, freq_size, seconds * 100)
+    with torch.no_grad():
+        traced = torch.jit.trace(fused, inputs.cuda() if cuda else inputs)
+    package = DeepSpeech.serialize(model)
+    del package['state_dict']
+    package['conv_params'] = fused.get_conv_params()
+    return traced, package
+
+
+def compare(model, exported, freq_size, runs=5, cuda=False):
+    """
+    Runs both models on random batches of a few lengths.
+    :return: The largest absolute difference between their outputs and the time per run of both
+    """
+    max_difference, model_time, exported_time = 0, 0, 0
+    for batch_size, seconds in ((1, 3), (4, 7), (2, 12)):
+        inputs = torch.randn(batch_size, 1, freq_size, seconds * 100)
+        inputs = inputs.cuda() if cuda else inputs
+        with torch.no_grad():
+            for _ in range(runs):
+                start = time.time()
+                expected = model(inputs)
+                model_time += time.time() - start
+                start = time.time()
+                out = exported(inputs)
+                exported_time += time.time() - start
+        max_difference = max(max_difference, (expected - out).abs().max().item())
+    return max_difference, model_time / (3 * runs), exported_time / (3 * runs)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    model = DeepSpeech.load_model(args.model_path)
+    model.eval()
+    traced, package = export_model(model, seconds=args.seconds, cuda=args.cuda)
+    torch.jit.save(traced, args.output_path, _extra_files={ExportedDeepSpeech.metadata_file: json.dumps(package)})
+
+    exported = DeepSpeech.load_model(args.output_path, cuda=args.cuda)
+    model = model.cuda() if args.cuda else model
+    audio_conf = DeepSpeech.get_audio_conf(model)
+    freq_size = int(audio_conf.get('sample_rate', 16000) * audio_conf.get('window_size', .02)) // 2 + 1
+    max_difference, model_time, exported_time = compare(model, exported, freq_size, args.runs, args.cuda)
+    print("Largest output difference {:.2e}, {:.3f}s per run unfused, {:.3f}s exported".format(
+        max_difference, model_time, exported_time))
+    if max_difference > args.tolerance:
+        raise ValueError("The exported model does not match the original model, largest difference {:.2e}".format(
+            max_difference))
+    print("Saved exported model to %s" % args.output_path)
@@ -0,0 +1,40 @@
+import torch.nn as nn
+import torch.nn.functional as F
+
+loss_backends = ('warpctc', 'native')
+
+
+class NativeCTCLoss(nn.Module):
+    def __init__(self, blank=0):
+        """
+        The CTC loss built into PyTorch, called like warpctc_pytorch.CTCLoss so it can replace it without a warp-ctc
+        build.
+        :param blank(default 0): Index of the CTC blank, warp-ctc always uses 0
+        """
+        super(NativeCTCLoss, self).__init__()
+        self.ctc_loss = nn.CTCLoss(blank=blank, reduction='sum')
+
+    def forward(self, acts, labels, act_lens, label_lens):
+        """
+        :param acts: Unnormalized activations TxNxH, the softmax is applied here as warp-ctc does internally
+        :param labels: The concatenated labels of the batch
+        :param act_lens: Number of activation frames of each sample
+        :param label_lens: Number of labels of each sample
+        :return: The loss summed over the batch, as a tensor of one element
+        """
+        log_probs = F.log_softmax(acts.float(), dim=-1)
+        return self.ctc_loss(log_probs, labels.long(), act_lens.long(), label_lens.long()).view(1)
+
+
+def get_loss(backend='warpctc'):
+    """
+    Returns the CTC loss of a backend, all backends return the loss summed over the batch.
+    :param backend(default warpctc): 'warpctc' for the warp-ctc bindings or 'native' for the PyTorch implementation
+    """
+    if backend == 'warpctc':
+        from warpctc_pytorch import CTCLoss
+
+        return CTCLoss()
+    if backend == 'native':
+        return NativeCTCLoss()
+    raise ValueError("Unknown loss backend %s, choose one of %s" % (backend, ', '.join(loss_backends)))
@@ -1,11 +1,17 @@
+import copy
+import inspect
+import json
 import math
+import zipfile
 from collections import OrderedDict
 
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+import torch.utils.checkpoint
 from torch.nn.parameter import Parameter
-from torch.autograd import Variable
+
+from data.data_loader import stft_pad_mode
 
 supported_rnns = {
     'lstm': nn.LSTM,
@@ -15,6 +21,24 @@ supported_rnns = {
 supported_rnns_inv = dict((v, k) for k, v in supported_rnns.items())
 
 
+def unwrap_model(model):
+    """
+    Returns the model inside a DataParallel or DistributedDataParallel wrapper.
+    """
+    if isinstance(model, (nn.DataParallel, nn.parallel.DistributedDataParallel)):
+        return model.module
+    return model
+
+
+def load_package(path):
+    """
+    Loads a package saved by DeepSpeech.serialize to the CPU. Packages are trusted files, quantized models hold packed
+    weights that torch.load only unpickles with weights_only=False, the default since torch 2.6 is True.
+    """
+    kwargs = {'weights_only': False} if 'weights_only' in inspect.signature(torch.load).parameters else {}
+    return torch.load(path, map_location=lambda storage, loc: storage, **kwargs)
+
+
 class SequenceWise(nn.Module):
     def __init__(self, module):
         """
@@ -25,7 +49,17 @@ class SequenceWise(nn.Module):
         super(SequenceWise, self).__init__()
         self.module = module
 
-    def forward(self, x):
+    def forward(self, x, mask=None):
+        """
+        :param x: Input of dim T*N*H
+        :param mask(default None): T*N mask of the frames that are not padding. If given the module is only applied to
+        these frames, so padding doesn't change batch norm statistics, and padded frames of the output are zero
+        """
+        if mask is not None:
+            y = self.module(x[mask])
+            out = y.new_zeros(x.size(0), x.size(1), y.size(-1))
+            out[mask] = y
+            return out
         t, n = x.size(0), x.size(1)
         x = x.view(t * n, -1)
         x = self.module(x)
@@ -39,6 +73,26 @@ class SequenceWise(nn.Module):
         return tmpstr
 
 
+def _sequence_mask(lengths, max_length):
+    # TxN mask of the frames of each sequence that are not padding
+    return torch.arange(max_length, device=lengths.device).unsqueeze(1) < lengths.long().unsqueeze(0)
+
+
+def _masked_batch_norm_2d(bn, x, mask):
+    # batch norm with statistics over the frames that are not padding, x is NxCxFxT and mask NxT
+    y = bn(x.permute(0, 3, 1, 2)[mask].unsqueeze(3)).squeeze(3)  # (frames)xCxF
+    out = y.new_zeros(x.size(0), x.size(3), x.size(1), x.size(2))
+    out[mask] = y
+    return out.permute(0, 2, 3, 1).contiguous()
+
+
+def _conv_output_lengths(lengths, conv_params):
+    # lengths after convolutions given as (kernel size, stride, padding, dilation) of their time dimension
+    for kernel_size, stride, padding, dilation in conv_params:
+        lengths = (lengths + 2 * padding - dilation * (kernel_size - 1) - 1) // stride + 1
+    return lengths
+
+
 class InferenceBatchSoftmax(nn.Module):
     def forward(self, input_):
         if not self.training:
@@ -57,14 +111,35 @@ class BatchRNN(nn.Module):
         self.rnn = rnn_type(input_size=input_size, hidden_size=hidden_size,
                             bidirectional=bidirectional, bias=False)
         self.num_directions = 2 if bidirectional else 1
+        self.checkpointing = False
+
+    def _run_rnn(self, x):
+        if self.checkpointing and self.training and torch.is_grad_enabled():
+            # the activations of the RNN are recomputed in the backward pass instead of being kept. The batch norm is
+            # left out, so its running statistics are only updated once
+            return torch.utils.checkpoint.checkpoint(self.rnn, x, use_reentrant=False)
+        return self.rnn(x)
 
     def flatten_parameters(self):
         self.rnn.flatten_parameters()
 
-    def forward(self, x):
-        if self.batch_norm is not None:
-            x = self.batch_norm(x)
-        x, _ = self.rnn(x)
+    def forward(self, x, output_lengths=None):
+        """
+        :param x: Input of dim T*N*H
+        :param output_lengths(default None): Number of frames of each sequence. If given the RNN runs on packed
+        sequences, only over the frames that are not padding
+        """
+        if output_lengths is None:
+            if self.batch_norm is not None:
+                x = self.batch_norm(x)
+            x, _ = self._run_rnn(x)
+        else:
+            if self.batch_norm is not None:
+                x = self.batch_norm(x, _sequence_mask(output_lengths, x.size(0)).to(x.device))
+            total_length = x.size(0)
+            x = nn.utils.rnn.pack_padded_sequence(x, output_lengths.cpu(), enforce_sorted=False)
+            x, _ = self._run_rnn(x)
+            x, _ = nn.utils.rnn.pad_packed_sequence(x, total_length=total_length)
         if self.bidirectional:
             x = x.view(x.size(0), x.size(1), 2, -1).sum(2).view(x.size(0), x.size(1), -1)  # (TxNxH*2) -> (TxNxH) by sum
         return x
@@ -89,20 +164,10 @@ class Lookahead(nn.Module):
         self.weight.data.uniform_(-stdv, stdv)
 
     def forward(self, input):
-        seq_len = input.size(0)
-        # pad the 0th dimension (T/sequence) with zeroes whose number = context
-        # Once pytorch's padding functions have settled, should move to those.
-        padding = torch.zeros(self.context, *(input.size()[1:])).type_as(input.data)
-        x = torch.cat((input, Variable(padding)), 0)
-
-        # add lookahead windows (with context+1 width) as a fourth dimension
-        # for each seq-batch-feature combination
-        x = [x[i:i + self.context + 1] for i in range(seq_len)]  # TxLxNxH - sequence, context, batch, feature
-        x = torch.stack(x)
-        x = x.permute(0, 2, 3, 1)  # TxNxHxL - sequence, batch, feature, context
-
-        x = torch.mul(x, self.weight).sum(dim=3)
-        return x
+        # depthwise convolution over time, the input is padded at the end with context zeroes
+        x = input.permute(1, 2, 0)  # NxHxT
+        x = F.conv1d(F.pad(x, (0, self.context)), self.weight.unsqueeze(1), groups=self.n_features)
+        return x.permute(2, 0, 1).contiguous()  # TxNxH
 
     def __repr__(self):
         return self.__class__.__name__ + '(' \
@@ -110,6 +175,116 @@ class Lookahead(nn.Module):
                + ', context=' + str(self.context) + ')'
 
 
+def _batch_norm_scale_shift(bn):
+    # eval mode batch norm as y = x * scale + shift
+    scale = bn.weight.data / torch.sqrt(bn.running_var + bn.eps)
+    shift = bn.bias.data - bn.running_mean * scale
+    return scale, shift
+
+
+def _fuse_conv_bn(conv, bn):
+    scale, shift = _batch_norm_scale_shift(bn)
+    fused = nn.Conv2d(conv.in_channels, conv.out_channels, kernel_size=conv.kernel_size, stride=conv.stride,
+                      padding=conv.padding, dilation=conv.dilation, groups=conv.groups, bias=True)
+    fused.weight.data.copy_(conv.weight.data * scale.view(-1, 1, 1, 1))
+    bias = conv.bias.data if conv.bias is not None else torch.zeros_like(shift)
+    fused.bias.data.copy_(bias * scale + shift)
+    return fused
+
+
+def _fuse_bn_linear(bn, linear):
+    scale, shift = _batch_norm_scale_shift(bn)
+    fused = nn.Linear(linear.in_features, linear.out_features, bias=True)
+    fused.weight.data.copy_(linear.weight.data * scale)
+    bias = linear.bias.data if linear.bias is not None else torch.zeros(linear.out_features)
+    fused.bias.data.copy_(bias + torch.mv(linear.weight.data, shift))
+    return fused
+
+
+def _fuse_bn_rnn(bn, rnn):
+    # the batch norm only touches the input to hidden projection of the first layer, the shift becomes its bias.
+    # This is also exact for GRUs, whose input bias is added outside of the reset gate
+    scale, shift = _batch_norm_scale_shift(bn)
+    fused = type(rnn)(input_size=rnn.input_size, hidden_size=rnn.hidden_size, num_layers=rnn.num_layers,
+                      bidirectional=rnn.bidirectional, bias=True)
+    state = fused.state_dict()
+    for name, value in state.items():
+        if name in rnn.state_dict():
+            value.copy_(rnn.state_dict()[name])
+        else:
+            value.zero_()
+    for suffix in ('_l0', '_l0_reverse') if rnn.bidirectional else ('_l0',):
+        weight = rnn.state_dict()['weight_ih' + suffix]
+        state['weight_ih' + suffix].copy_(weight * scale)
+        state['bias_ih' + suffix].add_(torch.mv(weight, shift))
+    fused.load_state_dict(state)
+    return fused
+
+
+class SpectrogramFrontend(nn.Module):
+    def __init__(self, audio_conf, normalize=True, pad_mode=stft_pad_mode):
+        """
+        Computes the spectrograms of SpectrogramParser.parse_audio for a whole batch of padded raw audio at once, so
+        feature extraction can run on the same device as the model instead of in the data loader workers.
+        :param audio_conf: Dictionary containing the sample rate, window and the window length/stride in seconds
+        :param normalize(default True): Apply standard mean and deviation normalization to each utterance
+        :param pad_mode(default constant): How the edges of each utterance are padded when centering the STFT frames,
+        'reflect' or 'constant'. The default matches SpectrogramParser, models trained on spectrograms of librosa
+        before 0.10 without a pad mode used 'reflect'
+        """
+        super(SpectrogramFrontend, self).__init__()
+        import scipy.signal
+
+        sample_rate = audio_conf.get('sample_rate', 16000)
+        self.n_fft = int(sample_rate * audio_conf.get('window_size', .02))
+        self.hop_length = int(sample_rate * audio_conf.get('window_stride', .01))
+        self.normalize = normalize
+        self.pad_mode = pad_mode
+        window = audio_conf.get('window', 'hamming')
+        if window not in ('hamming', 'hann', 'blackman', 'bartlett'):
+            window = 'hamming'
+        # librosa calls the scipy window functions directly, which gives a symmetric window
+        window = scipy.signal.get_window(window, self.n_fft, fftbins=False)
+        self.register_buffer('window', torch.FloatTensor(window))
+
+    def get_frame_lengths(self, lengths):
+        return lengths // self.hop_length + 1
+
+    def forward(self, audio, lengths):
+        """
+        :param audio: Batch of zero padded audio N x L, of any dtype
+        :param lengths: Length of each utterance in samples
+        :return: Zero padded spectrograms N x 1 x F x T and the number of frames of each spectrogram
+        """
+        lengths = lengths.long().to(audio.device)
+        max_length = audio.size(1)
+        pad = self.n_fft // 2
+        # sample index of every position of the centered signal, padded per utterance rather than per batch
+        positions = torch.arange(-pad, max_length + pad, device=audio.device).unsqueeze(0).expand(audio.size(0), -1)
+        utterance_lengths = lengths.unsqueeze(1)
+        if self.pad_mode == 'reflect':
+            positions = positions.abs()
+            positions = torch.where(positions >= utterance_lengths, 2 * (utterance_lengths - 1) - positions, positions)
+            signal = audio.float().gather(1, positions.clamp(0, max_length - 1))
+        else:
+            inside = (positions >= 0) & (positions < utterance_lengths)
+            signal = audio.float().gather(1, positions.clamp(0, max_length - 1)) * inside.float()
+
+        frames = signal.unfold(1, self.n_fft, self.hop_length) * self.window  # N x T x n_fft
+        spect = torch.log1p(torch.fft.rfft(frames, dim=2).abs()).transpose(1, 2)  # N x F x T
+
+        frame_lengths = self.get_frame_lengths(lengths)
+        mask = (torch.arange(spect.size(2), device=audio.device).unsqueeze(0) <
+                frame_lengths.unsqueeze(1)).unsqueeze(1).float()  # N x 1 x T
+        if self.normalize:
+            count = (frame_lengths * spect.size(1)).float().view(-1, 1, 1)
+            mean = (spect * mask).sum(dim=(1, 2), keepdim=True) / count
+            var = (((spect - mean) * mask) ** 2).sum(dim=(1, 2), keepdim=True) / (count - 1)
+            spect = (spect - mean) / var.sqrt()
+        spect = spect * mask
+        return spect.unsqueeze(1), frame_lengths.int()
+
+
 class DeepSpeech(nn.Module):
     def __init__(self, rnn_type=nn.LSTM, labels="abc", rnn_hidden_size=768, nb_layers=5, audio_conf=None,
                  bidirectional=True, context=20):
@@ -125,6 +300,7 @@ class DeepSpeech(nn.Module):
         self._audio_conf = audio_conf or {}
         self._labels = labels
         self._bidirectional = bidirectional
+        self._quantized = False
 
         sample_rate = self._audio_conf.get("sample_rate", 16000)
         window_size = self._audio_conf.get("window_size", 0.02)
@@ -168,30 +344,88 @@ class DeepSpeech(nn.Module):
         )
         self.inference_softmax = InferenceBatchSoftmax()
 
-    def forward(self, x):
-        x = self.conv(x)
+    def forward(self, x, lengths=None):
+        """
+        :param x: Batch of spectrograms N*1*F*T
+        :param lengths(default None): Number of spectrogram frames of each utterance. If given, padding is masked
+        after every convolution and kept out of the batch norm statistics, the RNNs run on packed sequences and the
+        output lengths are returned with the output
+        :return: Output of dim N*T*H, with the output lengths if lengths were given
+        """
+        if lengths is None:
+            x = self.conv(x)
+        else:
+            output_lengths = self.get_seq_lens(lengths)
+            x = self._masked_conv(x, lengths)
 
         sizes = x.size()
         x = x.view(sizes[0], sizes[1] * sizes[2], sizes[3])  # Collapse feature dimension
         x = x.transpose(1, 2).transpose(0, 1).contiguous()  # TxNxH
 
-        x = self.rnns(x)
+        if lengths is None:
+            x = self.rnns(x)
+        else:
+            for rnn in self.rnns:
+                x = rnn(x, output_lengths)
 
         if not self._bidirectional:  # no need for lookahead layer in bidirectional
             x = self.lookahead(x)
 
-        x = self.fc(x)
+        if lengths is None:
+            x = self.fc(x)
+        else:
+            x = self.fc[0](x, _sequence_mask(output_lengths, x.size(0)).to(x.device))
         x = x.transpose(0, 1)
         # identity in training mode, softmax in eval mode
         x = self.inference_softmax(x)
+        if lengths is None:
+            return x
+        return x, output_lengths
+
+    def set_rnn_checkpointing(self, enabled=True):
+        """
+        Recompute the activations of each RNN layer in the backward pass when training, trading compute for memory.
+        """
+        for rnn in self.rnns:
+            rnn.checkpointing = enabled
+
+    def get_conv_params(self):
+        """
+        Returns kernel size, stride, padding and dilation of the time dimension of each convolution.
+        """
+        return [(m.kernel_size[1], m.stride[1], m.padding[1], m.dilation[1])
+                for m in self.conv if isinstance(m, nn.Conv2d)]
+
+    def get_seq_lens(self, lengths):
+        """
+        Returns the number of output frames for inputs of the given numbers of spectrogram frames.
+        """
+        return _conv_output_lengths(lengths.int(), self.get_conv_params())
+
+    def _masked_conv(self, x, lengths):
+        # padding is zeroed after every module, so it doesn't leak into the next convolution or batch norm statistics
+        for module in self.conv:
+            if isinstance(module, nn.Conv2d):
+                lengths = _conv_output_lengths(lengths, [(module.kernel_size[1], module.stride[1], module.padding[1],
+                                                          module.dilation[1])])
+                x = module(x)
+                mask = _sequence_mask(lengths, x.size(3)).t().to(x.device)  # NxT
+            elif isinstance(module, nn.BatchNorm2d) and module.training:
+                x = _masked_batch_norm_2d(module, x, mask)
+            else:
+                x = module(x)
+            x = x * mask.view(mask.size(0), 1, 1, mask.size(1)).type_as(x)
         return x
 
     @classmethod
     def load_model(cls, path, cuda=False):
-        package = torch.load(path, map_location=lambda storage, loc: storage)
+        if ExportedDeepSpeech.is_exported(path):
+            return ExportedDeepSpeech.load(path, cuda=cuda)
+        package = load_package(path)
         model = cls(rnn_hidden_size=package['hidden_size'], nb_layers=package['hidden_layers'],
                     labels=package['labels'], audio_conf=package['audio_conf'],
                     rnn_type=supported_rnns[package['rnn_type']], bidirectional=package.get('bidirectional', True))
+        model = cls._prepare_quantized(model, package, cuda)
         # the blacklist parameters are params that were previous erroneously saved by the model
         # care should be taken in future versions that if batch_norm on the first rnn is required
         # that it be named something else
@@ -201,8 +435,9 @@ class DeepSpeech(nn.Module):
             if x in package['state_dict']:
                 del package['state_dict'][x]
         model.load_state_dict(package['state_dict'])
-        for x in model.rnns:
-            x.flatten_parameters()
+        if not model._quantized:
+            for x in model.rnns:
+                x.flatten_parameters()
         if cuda:
             model = torch.nn.DataParallel(model).cuda()
         return model
@@ -212,16 +447,76 @@ class DeepSpeech(nn.Module):
         model = cls(rnn_hidden_size=package['hidden_size'], nb_layers=package['hidden_layers'],
                     labels=package['labels'], audio_conf=package['audio_conf'],
                     rnn_type=supported_rnns[package['rnn_type']], bidirectional=package.get('bidirectional', True))
+        model = cls._prepare_quantized(model, package, cuda)
         model.load_state_dict(package['state_dict'])
         if cuda:
             model = torch.nn.DataParallel(model).cuda()
         return model
 
+    @staticmethod
+    def _prepare_quantized(model, package, cuda):
+        # a quantized state dict can only be loaded into a model that was quantized the same way
+        if not package.get('quantized', False):
+            return model
+        if cuda:
+            raise ValueError("Quantized models only run on the CPU")
+        return DeepSpeech.quantize(model)
+
+    @staticmethod
+    def quantize(model):
+        """
+        Returns a copy of the model for CPU inference, with the weights of the RNNs and the fully connected layer
+        quantized to int8. Activations are quantized dynamically while running. Plain RNNs stay in float32, as only
+        GRUs and LSTMs can be quantized.
+        """
+        model = copy.deepcopy(unwrap_model(model)).cpu()
+        model.eval()
+        for rnn in model.rnns:
+            if not rnn.rnn.bias:
+                # quantized RNNs need biases, replace the RNN by an equivalent one with biases of zero
+                biased_rnn = type(rnn.rnn)(input_size=rnn.rnn.input_size, hidden_size=rnn.rnn.hidden_size,
+                                           bidirectional=rnn.rnn.bidirectional, bias=True)
+                state = biased_rnn.state_dict()
+                for name, value in state.items():
+                    if name.startswith('bias'):
+                        value.zero_()
+                    else:
+                        value.copy_(rnn.rnn.state_dict()[name])
+                biased_rnn.load_state_dict(state)
+                rnn.rnn = biased_rnn
+        model = torch.quantization.quantize_dynamic(model, {nn.LSTM, nn.GRU, nn.Linear}, dtype=torch.qint8,
+                                                    inplace=True)
+        model._quantized = True
+        return model
+
+    @staticmethod
+    def fuse(model):
+        """
+        Returns a copy of the model for inference with the eval mode batch norms folded into the adjacent layers: the
+        convolution batch norms into the convolutions, the batch norm of each BatchRNN into the input weights of its
+        RNN and the batch norm of the fully connected layer into its linear layer.
+        """
+        model = copy.deepcopy(unwrap_model(model))
+        if model._quantized:
+            raise ValueError("Quantized models can't be fused, fuse the float32 model instead")
+        model.eval()
+        conv = list(model.conv)
+        for i, module in enumerate(conv):
+            if isinstance(module, nn.BatchNorm2d):
+                conv[i - 1], conv[i] = _fuse_conv_bn(conv[i - 1], module), nn.Identity()
+        model.conv = nn.Sequential(*conv)
+        for rnn in model.rnns:
+            if rnn.batch_norm is not None:
+                rnn.rnn = _fuse_bn_rnn(rnn.batch_norm.module, rnn.rnn)
+                rnn.batch_norm = None
+        batch_norm, linear = model.fc[0].module
+        model.fc[0].module = _fuse_bn_linear(batch_norm, linear)
+        return model
+
     @staticmethod
     def serialize(model, optimizer=None, epoch=None, iteration=None, loss_results=None,
-                  cer_results=None, wer_results=None, avg_loss=None, meta=None):
-        model_is_cuda = next(model.parameters()).is_cuda
-        model = model.module if model_is_cuda else model
+                  cer_results=None, wer_results=None, avg_loss=None, meta=None, amp_state=None):
+        model = unwrap_model(model)
         package = {
             'version': model._version,
             'hidden_size': model._hidden_size,
@@ -230,7 +525,8 @@ class DeepSpeech(nn.Module):
             'audio_conf': model._audio_conf,
             'labels': model._labels,
             'state_dict': model.state_dict(),
-            'bidirectional': model._bidirectional
+            'bidirectional': model._bidirectional,
+            'quantized': model._quantized
         }
         if optimizer is not None:
             package['optim_dict'] = optimizer.state_dict()
@@ -246,12 +542,13 @@ class DeepSpeech(nn.Module):
             package['wer_results'] = wer_results
         if meta is not None:
             package['meta'] = meta
+        if amp_state is not None:
+            package['amp_state'] = amp_state
         return package
 
     @staticmethod
     def get_labels(model):
-        model_is_cuda = next(model.parameters()).is_cuda
-        return model.module._labels if model_is_cuda else model._labels
+        return unwrap_model(model)._labels
 
     @staticmethod
     def get_param_size(model):
@@ -265,13 +562,11 @@ class DeepSpeech(nn.Module):
 
     @staticmethod
     def get_audio_conf(model):
-        model_is_cuda = next(model.parameters()).is_cuda
-        return model.module._audio_conf if model_is_cuda else model._audio_conf
+        return unwrap_model(model)._audio_conf
 
     @staticmethod
     def get_meta(model):
-        model_is_cuda = next(model.parameters()).is_cuda
-        m = model.module if model_is_cuda else model
+        m = unwrap_model(model)
         meta = {
             "version": m._version,
             "hidden_size": m._hidden_size,
@@ -281,6 +576,50 @@ class DeepSpeech(nn.Module):
         return meta
 
 
+class ExportedDeepSpeech(nn.Module):
+    metadata_file = 'deepspeech.json'
+
+    def __init__(self, traced, package):
+        """
+        A fused and traced DeepSpeech model written by export.py, carrying the metadata DeepSpeech.get_labels,
+        get_audio_conf and get_meta read. It can only be used for inference.
+        :param traced: The traced model
+        :param package: Metadata of the package format without the state dict, plus the time dimension parameters of
+        the convolutions returned by DeepSpeech.get_conv_params
+        """
+        super(ExportedDeepSpeech, self).__init__()
+        self.traced = traced
+        self._version = package['version']
+        self._hidden_size = package['hidden_size']
+        self._hidden_layers = package['hidden_layers']
+        self._rnn_type = supported_rnns[package['rnn_type']]
+        self._audio_conf = package['audio_conf']
+        self._labels = package['labels']
+        self._bidirectional = package['bidirectional']
+        self._quantized = False
+        self._conv_params = package['conv_params']
+
+    def forward(self, x, lengths=None):
+        # the traced model runs the whole padded batch, lengths only give the output lengths
+        x = self.traced(x)
+        if lengths is None:
+            return x
+        return x, _conv_output_lengths(lengths.int(), self._conv_params)
+
+    @staticmethod
+    def is_exported(path):
+        if not zipfile.is_zipfile(path):
+            return False
+        with zipfile.ZipFile(path) as archive:
+            return any(name.endswith('extra/' + ExportedDeepSpeech.metadata_file) for name in archive.namelist())
+
+    @staticmethod
+    def load(path, cuda=False):
+        extra_files = {ExportedDeepSpeech.metadata_file: ''}
+        traced = torch.jit.load(path, map_location='cuda' if cuda else 'cpu', _extra_files=extra_files)
+        return ExportedDeepSpeech(traced, json.loads(extra_files[ExportedDeepSpeech.metadata_file]))
+
+
 if __name__ == '__main__':
     import os.path
     import argparse
@@ -289,7 +628,7 @@ if __name__ == '__main__':
     parser.add_argument('--model-path', default='models/deepspeech_final.pth',
                         help='Path to model file created by training')
     args = parser.parse_args()
-    package = torch.load(args.model_path, map_location=lambda storage, loc: storage)
+    package = load_package(args.model_path)
     model = DeepSpeech.load_model(args.model_path)
 
     print("Model name:         ", os.path.basename(args.model_path))
@@ -299,6 +638,7 @@ if __name__ == '__main__':
     print("  RNN Type:         ", model._rnn_type.__name__.lower())
     print("  RNN Layers:       ", model._hidden_layers)
     print("  RNN Size:         ", model._hidden_size)
+    print("  Quantized:        ", model._quantized)
     print("  Classes:          ", len(model._labels))
     print("")
     print("Model Features")
@@ -0,0 +1,36 @@
+import argparse
+import subprocess
+import sys
+
+import torch
+
+parser = argparse.ArgumentParser(description='Launches one distributed training process per GPU, or per CPU rank',
+                                 usage='python multiproc.py [--world-size N] train.py [training args]')
+parser.add_argument('--world-size', default=None, type=int,
+                    help='Number of processes to start. Defaults to the number of GPUs, required without GPUs')
+parser.add_argument('script', help='Training script to launch')
+parser.add_argument('script_args', nargs=argparse.REMAINDER, help='Arguments passed on to every process')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    world_size = args.world_size or torch.cuda.device_count()
+    if world_size < 1:
+        parser.error('No GPUs found, set --world-size to the number of CPU processes')
+    use_gpus = '--cuda' in args.script_args
+
+    workers = []
+    for rank in range(world_size):
+        argv = [sys.executable, args.script] + args.script_args + ['--world-size', str(world_size), '--rank', str(rank)]
+        if use_gpus:
+            argv += ['--gpu-rank', str(rank)]
+        # only the first process writes to the console, the others log to a file each
+        stdout = None if rank == 0 else open('rank_%d.log' % rank, 'w')
+        workers.append((subprocess.Popen(argv, stdout=stdout, stderr=stdout), stdout))
+
+    return_code = 0
+    for worker, stdout in workers:
+        worker.wait()
+        return_code = return_code or worker.returncode
+        if stdout is not None:
+            stdout.close()
+    sys.exit(return_code)
@@ -0,0 +1,28 @@
+import argparse
+import json
+
+from data.packed_dataset import pack_manifest
+
+parser = argparse.ArgumentParser(description='Packs a manifest into memory-mappable shards')
+parser.add_argument('--manifest', metavar='DIR', help='path to manifest csv to pack', required=True)
+parser.add_argument('--output-dir', help='Directory to write the packed dataset to', required=True)
+parser.add_argument('--labels-path', default='labels.json', help='Contains all characters for transcription')
+parser.add_argument('--features', action='store_true',
+                    help='Store spectrograms instead of audio. Faster to load, but cannot be augmented')
+parser.add_argument('--shard-size', default=1024, type=int, help='Size of each shard in megabytes')
+parser.add_argument('--sample-rate', default=16000, type=int, help='Sample rate')
+parser.add_argument('--window-size', default=.02, type=float, help='Window size for spectrogram in seconds')
+parser.add_argument('--window-stride', default=.01, type=float, help='Window stride for spectrogram in seconds')
+parser.add_argument('--window', default='hamming', help='Window type for spectrogram generation')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    with open(args.labels_path) as label_file:
+        labels = str(''.join(json.load(label_file)))
+    audio_conf = dict(sample_rate=args.sample_rate,
+                      window_size=args.window_size,
+                      window_stride=args.window_stride,
+                      window=args.window)
+    pack_manifest(args.manifest, args.output_dir, labels, audio_conf, features=args.features,
+                  shard_size=args.shard_size * 1024 * 1024)
+    print('Packed %s into %s' % (args.manifest, args.output_dir))
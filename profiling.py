@@ -0,0 +1,198 @@
+from __future__ import print_function
+
+import json
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+
+
+class TrainingProfiler(object):
+    def __init__(self, output_path=None, cuda=False, interval=50, window=1000, stall_fraction=0.1,
+                 trace_start=None, trace_end=None, trace_path=None):
+        """
+        Times the phases of each training iteration and writes percentiles, throughput and data loader stalls to a
+        JSONL file every interval iterations. Profiling is off if no output path is given, phases are then not timed.
+        :param output_path(default None): JSONL file to append the records to
+        :param cuda(default False): Synchronize the GPU around each phase, so its kernels are counted in their phase
+        :param interval(default 50): Number of iterations per record
+        :param window(default 1000): Number of most recent times per phase the percentiles are taken over
+        :param stall_fraction(default 0.1): An iteration stalls on the data loader if waiting for the batch takes more
+        than this fraction of the iteration
+        :param trace_start(default None): First iteration of a torch profiler trace, counted from 1 in each epoch. The
+        trace is recorded independently of the JSONL records
+        :param trace_end(default None): Last iteration of the torch profiler trace
+        :param trace_path(default None): Where to write the chrome trace of the torch profiler
+        """
+        self.enabled = output_path is not None
+        self.output_path = output_path
+        self.cuda = cuda
+        self.interval = interval
+        self.stall_fraction = stall_fraction
+        self.trace_start = trace_start
+        self.trace_end = trace_end
+        self.trace_path = trace_path
+        self.times = defaultdict(lambda: deque(maxlen=window))
+        self._profiler = None
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.start_time = time.time()
+        self.samples = 0
+        self.audio_seconds = 0.0
+        self.iterations = 0
+        self.stalls = 0
+        self.queue_depths = []
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Context that adds its duration to the times of a phase.
+        """
+        if not self.enabled:
+            yield
+            return
+        if self.cuda:
+            torch.cuda.synchronize()
+        start = time.time()
+        yield
+        if self.cuda:
+            torch.cuda.synchronize()
+        self.times[name].append(time.time() - start)
+
+    def add(self, name, seconds):
+        if self.enabled:
+            self.times[name].append(seconds)
+
+    def begin_iteration(self, iteration):
+        """
+        Starts the torch profiler trace at its first iteration.
+        :param iteration: Number of the iteration in the epoch, counted from 1
+        """
+        if self.trace_start is not None and iteration == self.trace_start and self._profiler is None:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if self.cuda:
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self._profiler = torch.profiler.profile(activities=activities, record_shapes=True)
+            self._profiler.__enter__()
+
+    def record_iteration(self, iteration, batch_size, audio_seconds, data_time, iteration_time, loader_iterator=None):
+        """
+        Counts a finished iteration and stops the torch profiler trace after its last iteration.
+        :param iteration: Number of the iteration in the epoch, counted from 1
+        :param batch_size: Number of samples of the batch
+        :param audio_seconds: Seconds of audio in the batch, without padding
+        :param data_time: Time spent waiting for the batch
+        :param iteration_time: Time of the whole iteration, including data_time
+        :param loader_iterator(default None): Iterator of the data loader, to read the number of batches waiting in
+        its queue
+        """
+        if self._profiler is not None and iteration >= (self.trace_end or self.trace_start):
+            self._profiler.__exit__(None, None, None)
+            self._profiler.export_chrome_trace(self.trace_path)
+            print("Wrote profiler trace of iterations %d-%d to %s" % (self.trace_start, iteration, self.trace_path))
+            self._profiler = None
+            self.trace_start = None
+        if not self.enabled:
+            return
+        self.samples += batch_size
+        self.audio_seconds += audio_seconds
+        self.iterations += 1
+        if data_time > self.stall_fraction * iteration_time:
+            self.stalls += 1
+        depth = loader_queue_depth(loader_iterator)
+        if depth is not None:
+            self.queue_depths.append(depth)
+
+    def summary(self):
+        """
+        :return: Mean, median, 90th and 99th percentile and total time of each phase in seconds
+        """
+        phases = {}
+        for name, times in self.times.items():
+            times = np.array(times)
+            phases[name] = {
+                'mean': float(times.mean()),
+                'p50': float(np.percentile(times, 50)),
+                'p90': float(np.percentile(times, 90)),
+                'p99': float(np.percentile(times, 99)),
+                'total': float(times.sum())
+            }
+        return phases
+
+    def should_log(self):
+        return self.enabled and self.iterations >= self.interval
+
+    def log(self, epoch, iteration):
+        """
+        Appends a record of the iterations since the last record to the JSONL file and resets the throughput counters.
+        :return: The record
+        """
+        elapsed = time.time() - self.start_time
+        record = {
+            'epoch': epoch,
+            'iteration': iteration,
+            'iterations': self.iterations,
+            'phases': self.summary(),
+            'samples_per_second': self.samples / elapsed,
+            'audio_seconds_per_second': self.audio_seconds / elapsed,
+            'loader_stalls': self.stalls,
+            'loader_queue_depth': float(np.mean(self.queue_depths)) if self.queue_depths else None
+        }
+        self.write(record)
+        self._reset_counters()
+        return record
+
+    def write(self, record):
+        with open(self.output_path, 'a') as output_file:
+            output_file.write(json.dumps(record) + '\n')
+
+
+def loader_queue_depth(loader_iterator):
+    """
+    :return: Number of batches the workers of a data loader finished and that wait to be used, None if unknown
+    """
+    data_queue = getattr(loader_iterator, '_data_queue', None)
+    if data_queue is None or not hasattr(data_queue, 'qsize'):
+        return None
+    try:
+        return data_queue.qsize()
+    except NotImplementedError:  # not available on macOS
+        return None
+
+
+def profile_data_pipeline(dataset, collate_fn, num_samples=20, batch_size=8):
+    """
+    Times the steps of loading samples in the current process, as the data loader workers run them: loading with
+    augmentation and noise, the STFT, normalization, the transcript and collating a batch.
+    :param dataset: A SpectrogramDataset
+    :return: Mean seconds per sample of each step, collation per batch
+    """
+    times = defaultdict(list)
+    batch = []
+    # one untimed sample first, the audio libraries are only imported when first used
+    dataset.log_spectrogram(dataset.load_augmented_audio(dataset.ids[0][0]))
+    for index in range(min(num_samples, len(dataset))):
+        audio_path, transcript_path = dataset.ids[index][0], dataset.ids[index][1]
+        start = time.time()
+        add_noise = dataset.noiseInjector is not None and np.random.binomial(1, dataset.noise_prob)
+        y = dataset.load_augmented_audio(audio_path, add_noise)
+        times['load_augment'].append(time.time() - start)
+        start = time.time()
+        spect = dataset.log_spectrogram(y)
+        times['stft'].append(time.time() - start)
+        start = time.time()
+        spect = dataset.to_tensor(spect)
+        times['normalize'].append(time.time() - start)
+        start = time.time()
+        transcript = dataset.parse_transcript(transcript_path)
+        times['transcript'].append(time.time() - start)
+        batch.append((spect, transcript))
+        if len(batch) == batch_size:
+            start = time.time()
+            collate_fn(batch)
+            times['collate_batch'].append(time.time() - start)
+            batch = []
+    return dict((name, float(np.mean(values))) for name, values in times.items())
@@ -0,0 +1,19 @@
+import argparse
+
+import torch
+
+from model import DeepSpeech, load_package
+
+parser = argparse.ArgumentParser(description='Quantizes a DeepSpeech model to int8 for CPU inference')
+parser.add_argument('--model-path', default='models/deepspeech_final.pth',
+                    help='Path to model file created by training')
+parser.add_argument('--output-path', default='models/deepspeech_quantized.pth',
+                    help='Where to save the quantized model, it can be used with transcribe.py, test.py and server.py')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    package = load_package(args.model_path)
+    model = DeepSpeech.load_model(args.model_path)
+    model = DeepSpeech.quantize(model)
+    torch.save(DeepSpeech.serialize(model, meta=package.get('meta')), args.output_path)
+    print("Saved quantized model to %s" % args.output_path)
@@ -0,0 +1,140 @@
+import numpy as np
+import torch
+
+from data.data_loader import _collate_fn
+
+
+def split_on_silence(y, sample_rate, max_duration=15.0, min_duration=5.0, frame_duration=0.02):
+    """
+    Splits audio into consecutive segments of at most max_duration seconds, cutting at the quietest frame in the last
+    part of every segment, which is usually a pause between words.
+    :param y: Audio samples
+    :param sample_rate: Sample rate of the audio
+    :param max_duration(default 15.0): Maximum length of a segment in seconds
+    :param min_duration(default 5.0): Segments are cut at the quietest frame after this many seconds
+    :param frame_duration(default 0.02): Length of the frames whose energy is compared, in seconds
+    :return: List of (start, end) sample indices
+    """
+    frame_length = max(int(sample_rate * frame_duration), 1)
+    max_length = int(sample_rate * max_duration)
+    min_length = min(int(sample_rate * min_duration), max_length - frame_length)
+    num_frames = len(y) // frame_length
+    energy = np.square(y[:num_frames * frame_length].astype(np.float64)).reshape(num_frames, frame_length).sum(1)
+    segments = []
+    start = 0
+    while len(y) - start > max_length:
+        first, last = (start + min_length) // frame_length, (start + max_length) // frame_length
+        quietest = first + int(np.argmin(energy[first:last]))
+        end = quietest * frame_length + frame_length // 2  # cut in the middle of the quietest frame
+        segments.append((start, end))
+        start = end
+    segments.append((start, len(y)))
+    return segments
+
+
+def split_windows(num_samples, sample_rate, window_duration=15.0, overlap_duration=2.0):
+    """
+    Splits audio into windows of a fixed length that overlap their neighbours.
+    :param num_samples: Length of the audio in samples
+    :param sample_rate: Sample rate of the audio
+    :param window_duration(default 15.0): Length of every window in seconds
+    :param overlap_duration(default 2.0): Length of the overlap between consecutive windows in seconds
+    :return: List of (start, end) sample indices
+    """
+    window_length = int(sample_rate * window_duration)
+    step = window_length - int(sample_rate * overlap_duration)
+    if step <= 0:
+        raise ValueError("The overlap has to be shorter than the window")
+    segments = []
+    start = 0
+    while start + window_length < num_samples:
+        segments.append((start, start + window_length))
+        start += step
+    segments.append((start, num_samples))
+    return segments
+
+
+def stitch(segments, transcripts, offsets, frame_samples, separator=''):
+    """
+    Joins the transcripts of consecutive, possibly overlapping, segments. Where two segments overlap, characters
+    before the middle of the overlap are taken from the first segment and the rest from the second one.
+    :param segments: List of (start, end) sample indices
+    :param transcripts: Transcript of each segment
+    :param offsets: Offsets of the characters of each segment, in model output frames relative to the segment start
+    :param frame_samples: Number of samples per model output frame
+    :param separator(default ''): Inserted between segments where neither side has a space, e.g. ' ' when the
+    segments were cut at pauses
+    :return: The transcript and the offset of each of its characters in output frames from the start of the audio
+    """
+    transcript, transcript_offsets = '', []
+    for i, ((start, end), text, text_offsets) in enumerate(zip(segments, transcripts, offsets)):
+        global_offsets = [start // frame_samples + int(offset) for offset in text_offsets]
+        lower = (start + segments[i - 1][1]) / 2.0 if i > 0 else float('-inf')
+        upper = (segments[i + 1][0] + end) / 2.0 if i + 1 < len(segments) else float('inf')
+        kept = [(char, offset) for char, offset in zip(text, global_offsets)
+                if lower <= offset * frame_samples < upper]
+        if not kept:
+            continue
+        if separator and transcript and not transcript.endswith(' ') and kept[0][0] != ' ':
+            transcript += separator
+            transcript_offsets.append(kept[0][1])
+        transcript += ''.join(char for char, _ in kept)
+        transcript_offsets.extend(offset for _, offset in kept)
+    return transcript, transcript_offsets
+
+
+def transcribe_segments(model, decoder, parser, y, segments, batch_size=8, cuda=False):
+    """
+    Runs the segments of a long audio file through the model in padded batches, longest segments first.
+    :param model: DeepSpeech model
+    :param decoder: Decoder whose best path is used for every segment
+    :param parser: SpectrogramParser computing the spectrogram of each segment
+    :param y: Audio samples
+    :param segments: List of (start, end) sample indices
+    :param batch_size(default 8): Number of segments per batch
+    :param cuda(default False): Move the batches to the GPU
+    :return: Transcript and offsets of each segment, in the order of segments
+    """
+    order = sorted(range(len(segments)), key=lambda i: segments[i][1] - segments[i][0], reverse=True)
+    transcripts, offsets = [None] * len(segments), [None] * len(segments)
+    for batch_start in range(0, len(order), batch_size):
+        indices = order[batch_start:batch_start + batch_size]
+        batch = [(parser.parse_audio_data(y[segments[i][0]:segments[i][1]]), []) for i in indices]
+        inputs, _, input_percentages, _ = _collate_fn(batch)
+        if cuda:
+            inputs = inputs.cuda()
+        input_sizes = input_percentages.mul_(int(inputs.size(3))).round().int()
+        with torch.no_grad():
+            out, sizes = model(inputs, input_sizes)
+        out = out.transpose(0, 1)  # TxNxH
+        decoded_output, decoded_offsets = decoder.decode(out.data, sizes.cpu())
+        for x, i in enumerate(indices):
+            transcripts[i] = decoded_output[x][0]
+            offsets[i] = decoded_offsets[x][0]
+    return transcripts, offsets
+
+
+def transcribe_long_audio(model, decoder, parser, y, mode='silence', max_duration=15.0, overlap_duration=2.0,
+                          batch_size=8, cuda=False):
+    """
+    Transcribes audio of any length by splitting it into segments that are batched through the model, keeping peak
+    memory bounded by the segment length and batch size.
+    :param mode(default silence): 'silence' cuts at pauses, 'window' uses overlapping windows of a fixed length
+    :param max_duration(default 15.0): Maximum length of a segment in seconds
+    :param overlap_duration(default 2.0): Overlap between windows in seconds, only used by the window mode
+    :return: The transcript and the offset of each character in model output frames
+    """
+    sample_rate = parser.sample_rate
+    if mode == 'silence':
+        segments = split_on_silence(y, sample_rate, max_duration=max_duration, min_duration=max_duration / 3)
+        separator = ' '
+    elif mode == 'window':
+        segments = split_windows(len(y), sample_rate, window_duration=max_duration,
+                                 overlap_duration=overlap_duration)
+        separator = ''
+    else:
+        raise ValueError("Unknown segmentation mode {}".format(mode))
+    transcripts, offsets = transcribe_segments(model, decoder, parser, y, segments, batch_size, cuda)
+    # every output frame spans two spectrogram frames, as the first convolution has a stride of 2 in time
+    frame_samples = 2 * int(sample_rate * parser.window_stride)
+    return stitch(segments, transcripts, offsets, frame_samples, separator)
@@ -0,0 +1,190 @@
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import threading
+import time
+import warnings
+from tempfile import NamedTemporaryFile
+
+warnings.simplefilter('ignore')
+
+import torch
+from six.moves import queue
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+
+from data.data_loader import SpectrogramParser, _collate_fn
+from model import DeepSpeech
+from transcribe import add_decoder_args, decode_results, load_decoder
+
+parser = argparse.ArgumentParser(description='DeepSpeech transcription server')
+parser.add_argument('--model-path', default='models/deepspeech_final.pth',
+                    help='Path to model file created by training')
+parser.add_argument('--cuda', action="store_true", help='Use cuda to run the model')
+parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+parser.add_argument('--port', default=8888, type=int, help='Port to listen on')
+parser.add_argument('--max-batch-size', default=16, type=int, help='Maximum number of requests run in one batch')
+parser.add_argument('--max-wait', default=0.05, type=float,
+                    help='Seconds the first request of a batch waits for more requests to arrive')
+add_decoder_args(parser)
+
+
+class _Request(object):
+    def __init__(self, spect):
+        self.spect = spect
+        self.enqueued = time.time()
+        self.done = threading.Event()
+        self.output, self.offsets, self.latency, self.error = None, None, None, None
+
+
+class BatchingTranscriber(object):
+    def __init__(self, model, decoder, audio_conf, max_batch_size=16, max_wait=0.05, cuda=False):
+        """
+        Keeps a model resident and transcribes requests from many threads in batches. A worker thread takes the
+        first waiting request, collects more until the batch is full or the request has waited max_wait seconds, and
+        runs the batch, sorted by length, through a single forward pass.
+        :param model: DeepSpeech model
+        :param decoder: Decoder used for every batch
+        :param audio_conf: Dictionary containing the sample rate, window and the window length/stride in seconds
+        :param max_batch_size(default 16): Maximum number of requests per batch
+        :param max_wait(default 0.05): Maximum time in seconds a request waits for a batch to fill up
+        :param cuda(default False): Move the batches to the GPU
+        """
+        self.model = model
+        self.decoder = decoder
+        self.parser = SpectrogramParser(audio_conf, normalize=True)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.cuda = cuda
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run)
+        self._worker.daemon = True
+        self._worker.start()
+
+    def transcribe(self, audio_path):
+        """
+        Blocks until the audio file is transcribed.
+        :return: Decoded output and offsets of the file, and its queueing and compute time in seconds
+        """
+        request = _Request(self.parser.parse_audio(audio_path))
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.output, request.offsets, request.latency
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = sorted(self._next_batch(), key=lambda request: request.spect.size(1), reverse=True)
+            try:
+                self._transcribe_batch(batch)
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+
+    def _transcribe_batch(self, batch):
+        start = time.time()
+        inputs, _, input_percentages, _ = _collate_fn([(request.spect, []) for request in batch])
+        if self.cuda:
+            inputs = inputs.cuda()
+        input_sizes = input_percentages.mul_(int(inputs.size(3))).round().int()
+        with torch.no_grad():
+            out, sizes = self.model(inputs, input_sizes)
+        out = out.transpose(0, 1)  # TxNxH
+        decoded_output, decoded_offsets = self.decoder.decode(out.data, sizes.cpu())
+        end = time.time()
+        for x, request in enumerate(batch):
+            request.output, request.offsets = decoded_output[x], decoded_offsets[x]
+            request.latency = {
+                'queue': start - request.enqueued,
+                'compute': end - start,
+                'batch_size': len(batch)
+            }
+            request.done.set()
+
+
+class TranscriptionHandler(BaseHTTPRequestHandler):
+    """
+    POST the audio file to /transcribe, the response is the json of transcribe.py with the latency of the request
+    added to its _meta.
+    """
+    transcriber = None
+    args = None
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/transcribe':
+            self.send_error(404)
+            return
+        received = time.time()
+        content_length = self.headers.get('Content-Length')
+        if content_length is None:
+            self.send_error(411, 'Content-Length is required')
+            return
+        try:
+            content_length = int(content_length)
+        except ValueError:
+            content_length = -1
+        if content_length < 0:
+            self.send_error(400, 'Invalid Content-Length')
+            return
+        audio = self.rfile.read(content_length)
+        with NamedTemporaryFile(suffix='.wav') as audio_file:
+            audio_file.write(audio)
+            audio_file.flush()
+            try:
+                output, offsets, latency = self.transcriber.transcribe(audio_file.name)
+            except Exception as e:
+                self.send_error(400, str(e))
+                return
+        results = decode_results(self.transcriber.model, [output], [offsets], self.args)
+        latency['total'] = time.time() - received
+        results['_meta']['latency'] = latency
+        body = json.dumps(results).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadedHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    model = DeepSpeech.load_model(args.model_path, cuda=args.cuda)
+    model.eval()
+    labels = DeepSpeech.get_labels(model)
+    decoder = load_decoder(labels, args)
+
+    TranscriptionHandler.transcriber = BatchingTranscriber(model, decoder, DeepSpeech.get_audio_conf(model),
+                                                           max_batch_size=args.max_batch_size,
+                                                           max_wait=args.max_wait, cuda=args.cuda)
+    TranscriptionHandler.args = args
+    server = ThreadedHTTPServer((args.host, args.port), TranscriptionHandler)
+    print("Serving %s on http://%s:%d/transcribe" % (os.path.basename(args.model_path), args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+        decoder.close()
@@ -0,0 +1,257 @@
+import numpy as np
+import scipy.signal
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from data.data_loader import stft_pad_mode
+from model import DeepSpeech, unwrap_model
+
+
+class StreamingSpectrogram(object):
+    def __init__(self, audio_conf, normalize=True, pad_mode=stft_pad_mode):
+        """
+        Computes the spectrogram of SpectrogramParser.parse_audio chunk by chunk. Frames are returned as soon as all
+        of their samples have arrived, the centering padding is applied at the start and the end of the stream.
+        Normalization uses the mean and standard deviation of all frames seen so far instead of the whole utterance.
+        :param audio_conf: Dictionary containing the sample rate, window and the window length/stride in seconds
+        :param normalize(default True): Apply running mean and deviation normalization
+        :param pad_mode(default constant): Padding at the edges of the stream, 'reflect' or 'constant'
+        """
+        sample_rate = audio_conf.get('sample_rate', 16000)
+        self.n_fft = int(sample_rate * audio_conf.get('window_size', .02))
+        self.hop_length = int(sample_rate * audio_conf.get('window_stride', .01))
+        self.pad = self.n_fft // 2
+        self.normalize = normalize
+        self.pad_mode = pad_mode
+        window = audio_conf.get('window', 'hamming')
+        if window not in ('hamming', 'hann', 'blackman', 'bartlett'):
+            window = 'hamming'
+        self.window = scipy.signal.get_window(window, self.n_fft, fftbins=False)
+        self.reset()
+
+    def reset(self):
+        self._samples = np.zeros(0)
+        self._tail = np.zeros(0)  # last samples of the stream, for reflecting at its end
+        self._started = False
+        self._count, self._sum, self._sum_squares = 0, 0.0, 0.0
+
+    def _pad_start(self, samples):
+        if self.pad_mode == 'reflect':
+            return np.concatenate((samples[self.pad:0:-1], samples))
+        return np.concatenate((np.zeros(self.pad), samples))
+
+    def _frames(self):
+        num_frames = (len(self._samples) - self.n_fft) // self.hop_length + 1
+        if num_frames <= 0:
+            return np.zeros((self.n_fft // 2 + 1, 0), dtype=np.float32)
+        frames = np.lib.stride_tricks.as_strided(
+            self._samples, shape=(num_frames, self.n_fft),
+            strides=(self._samples.strides[0] * self.hop_length, self._samples.strides[0]))
+        spect = np.log1p(np.abs(np.fft.rfft(frames * self.window, axis=1))).T
+        self._samples = self._samples[num_frames * self.hop_length:]
+        if self.normalize:
+            self._count += spect.size
+            self._sum += spect.sum(dtype=np.float64)
+            self._sum_squares += np.square(spect, dtype=np.float64).sum()
+            mean = self._sum / self._count
+            std = np.sqrt(max(self._sum_squares - self._count * mean ** 2, 0) / max(self._count - 1, 1))
+            spect = (spect - mean) / (std if std > 0 else 1)
+        return spect.astype(np.float32)
+
+    def feed(self, samples):
+        """
+        :param samples: Next samples of the stream, as returned by load_audio
+        :return: Spectrogram frames F x T that were completed by the chunk
+        """
+        samples = np.asarray(samples, dtype=np.float64)
+        self._tail = np.concatenate((self._tail, samples))[-(self.pad + 1):]
+        self._samples = np.concatenate((self._samples, samples))
+        if not self._started:
+            if len(self._samples) <= self.pad:
+                return self._frames()
+            self._samples = self._pad_start(self._samples)
+            self._started = True
+        return self._frames()
+
+    def finish(self):
+        """
+        Pads the end of the stream.
+        :return: The remaining spectrogram frames
+        """
+        if not self._started:
+            # streams shorter than half a window are padded at once, as librosa does
+            self._samples = np.pad(self._samples, self.pad, mode=self.pad_mode)
+            self._started = True
+        elif self.pad_mode == 'reflect':
+            self._samples = np.concatenate((self._samples, self._tail[-2::-1]))
+        else:
+            self._samples = np.concatenate((self._samples, np.zeros(self.pad)))
+        return self._frames()
+
+
+class StreamingConv(object):
+    def __init__(self, conv, activations):
+        """
+        Applies a convolution over time to frames arriving in chunks. Input frames are buffered until the kernel
+        covers them, the time padding of the convolution is added as zero frames at the start and the end of the
+        stream.
+        :param conv: nn.Conv2d whose last dimension is time
+        :param activations: Modules applied to the output frames, that have to work frame by frame
+        """
+        self.conv = conv
+        self.activations = activations
+        self.kernel = conv.kernel_size[1]
+        self.stride = conv.stride[1]
+        self.time_pad = conv.padding[1]
+        self.reset()
+
+    def reset(self):
+        self._buffer = None
+
+    def _zeros(self, x):
+        return x.new_zeros(x.size(0), x.size(1), x.size(2), self.time_pad)
+
+    def _outputs(self):
+        num_outputs = (self._buffer.size(3) - self.kernel) // self.stride + 1
+        if num_outputs <= 0:
+            return None
+        x = self._buffer[:, :, :, :(num_outputs - 1) * self.stride + self.kernel]
+        self._buffer = self._buffer[:, :, :, num_outputs * self.stride:]
+        x = F.conv2d(x, self.conv.weight, self.conv.bias, (self.conv.stride[0], self.stride),
+                     (self.conv.padding[0], 0), self.conv.dilation, self.conv.groups)
+        for module in self.activations:
+            x = module(x)
+        return x
+
+    def feed(self, x):
+        if x is None:
+            return None
+        if self._buffer is None:
+            self._buffer = torch.cat((self._zeros(x), x), 3)
+        else:
+            self._buffer = torch.cat((self._buffer, x), 3)
+        return self._outputs()
+
+    def finish(self, x):
+        outputs = self.feed(x)
+        if self._buffer is None:
+            return outputs
+        self._buffer = torch.cat((self._buffer, self._zeros(self._buffer)), 3)
+        last_outputs = self._outputs()
+        if outputs is None or last_outputs is None:
+            return outputs if last_outputs is None else last_outputs
+        return torch.cat((outputs, last_outputs), 3)
+
+
+class StreamingTranscriber(object):
+    def __init__(self, model, normalize=True, pad_mode=stft_pad_mode, blank_index=None, cuda=False):
+        """
+        Transcribes a stream of audio chunk by chunk with a unidirectional DeepSpeech model. The hidden state of the
+        RNNs and the context the convolutions and the lookahead layer need is carried between chunks, so the work and
+        memory per chunk do not grow with the length of the stream. Characters are greedy decoded as soon as the
+        lookahead layer has seen enough future frames.
+        :param model: DeepSpeech model trained with bidirectional=False
+        :param normalize(default True): Normalize the spectrogram with the running mean and deviation of the stream
+        :param pad_mode(default constant): How the STFT pads the edges of the stream, see SpectrogramFrontend
+        :param blank_index(default None): Index of the CTC blank, defaults to the index of '_' in the labels
+        :param cuda(default False): Run the model on the GPU
+        """
+        model = unwrap_model(model)
+        if not isinstance(model, DeepSpeech):
+            raise ValueError("Streaming needs the layers of the model, exported models can't be streamed")
+        if model._bidirectional:
+            raise ValueError("Streaming needs a model trained with bidirectional=False")
+        model.eval()
+        self.model = model.cuda() if cuda else model
+        self.cuda = cuda
+        self.labels = model._labels
+        self.blank_index = self.labels.index('_') if blank_index is None else blank_index
+        self.spectrogram = StreamingSpectrogram(model._audio_conf, normalize=normalize, pad_mode=pad_mode)
+        self.convs = []
+        for module in model.conv:
+            if isinstance(module, nn.Conv2d):
+                self.convs.append(StreamingConv(module, []))
+            else:
+                self.convs[-1].activations.append(module)
+        self.context = model.lookahead[0].context
+        self.reset()
+
+    def reset(self):
+        """
+        Starts a new stream.
+        """
+        self.spectrogram.reset()
+        for conv in self.convs:
+            conv.reset()
+        self._hidden = [None] * len(self.model.rnns)
+        self._lookahead_buffer = None
+        self._num_frames = 0
+        self._last_label = self.blank_index
+        self.transcript = ''
+        self.offsets = []
+
+    def _rnns(self, x):
+        sizes = x.size()
+        x = x.view(sizes[0], sizes[1] * sizes[2], sizes[3])  # Collapse feature dimension
+        x = x.transpose(1, 2).transpose(0, 1).contiguous()  # TxNxH
+        for i, rnn in enumerate(self.model.rnns):
+            if rnn.batch_norm is not None:
+                x = rnn.batch_norm(x)
+            x, self._hidden[i] = rnn.rnn(x, self._hidden[i])
+        return x
+
+    def _decode(self, x):
+        """
+        Applies the fully connected layer to lookahead output and greedy decodes it, continuing from the last label.
+        """
+        probs = self.model.inference_softmax(self.model.fc(x).transpose(0, 1))
+        _, labels = torch.max(probs[0], 1)
+        labels = labels.view(-1).cpu().numpy()
+        previous = np.concatenate(([self._last_label], labels[:-1]))
+        keep = (labels != self.blank_index) & (labels != previous)
+        text = ''.join(self.labels[label] for label in labels[keep])
+        self.offsets.extend((np.flatnonzero(keep) + self._num_frames).tolist())
+        self.transcript += text
+        self._num_frames += len(labels)
+        self._last_label = labels[-1]
+        return text
+
+    def _step(self, spect, last=False):
+        x = torch.from_numpy(spect).view(1, 1, spect.shape[0], spect.shape[1])
+        if self.cuda:
+            x = x.cuda()
+        for conv in self.convs:
+            x = conv.finish(x) if last else conv.feed(x)
+        if x is not None:
+            x = self._rnns(x)
+            buffer = x if self._lookahead_buffer is None else torch.cat((self._lookahead_buffer, x), 0)
+        else:
+            buffer = self._lookahead_buffer
+        if buffer is None:
+            return ''
+        # the lookahead pads the end with zero frames, so only outputs with all of their future frames are final
+        num_ready = buffer.size(0) if last else buffer.size(0) - self.context
+        if num_ready <= 0:
+            self._lookahead_buffer = buffer
+            return ''
+        x = self.model.lookahead(buffer)[:num_ready]
+        self._lookahead_buffer = buffer[num_ready:]
+        return self._decode(x)
+
+    def feed(self, samples):
+        """
+        :param samples: Next chunk of audio, as returned by load_audio
+        :return: The characters decoded from the chunk, completing the transcript so far
+        """
+        with torch.no_grad():
+            return self._step(self.spectrogram.feed(samples))
+
+    def finish(self):
+        """
+        Ends the stream and decodes the frames that were held back for context.
+        :return: The remaining characters of the transcript
+        """
+        with torch.no_grad():
+            text = self._step(self.spectrogram.finish(), last=True)
+        return text
@@ -7,6 +7,7 @@ from tqdm import tqdm
 from decoder import GreedyDecoder
 
 from data.data_loader import SpectrogramDataset, AudioDataLoader
+from data.packed_dataset import PackedSpectrogramDataset, is_packed_dataset
 from model import DeepSpeech
 
 parser = argparse.ArgumentParser(description='DeepSpeech transcription')
@@ -14,10 +15,12 @@ parser.add_argument('--model-path', default='models/deepspeech_final.pth',
                     help='Path to model file created by training')
 parser.add_argument('--cuda', action="store_true", help='Use cuda to test model')
 parser.add_argument('--test-manifest', metavar='DIR',
-                    help='path to validation manifest csv', default='data/test_manifest.csv')
+                    help='path to test manifest csv or packed dataset directory', default='data/test_manifest.csv')
 parser.add_argument('--batch-size', default=20, type=int, help='Batch size for training')
 parser.add_argument('--num-workers', default=4, type=int, help='Number of workers used in dataloading')
-parser.add_argument('--decoder', default="greedy", choices=["greedy", "beam", "none"], type=str, help="Decoder to use")
+parser.add_argument('--decoder', default="greedy", choices=["greedy", "beam", "prefix_beam", "none"], type=str,
+                    help="Decoder to use")
+parser.add_argument('--feature-cache-dir', default=None, help='Directory to cache spectrograms in between runs')
 parser.add_argument('--verbose', action="store_true", help="print out decoded output and error of each sample")
 no_decoder_args = parser.add_argument_group("No Decoder Options", "Configuration options for when no decoder is "
                                                                   "specified")
@@ -50,13 +53,24 @@ if __name__ == '__main__':
         decoder = BeamCTCDecoder(labels, lm_path=args.lm_path, alpha=args.alpha, beta=args.beta,
                                  cutoff_top_n=args.cutoff_top_n, cutoff_prob=args.cutoff_prob,
                                  beam_width=args.beam_width, num_processes=args.lm_workers)
+    elif args.decoder == "prefix_beam":
+        from decoder import PrefixBeamCTCDecoder
+
+        decoder = PrefixBeamCTCDecoder(labels, lm_path=args.lm_path, alpha=args.alpha, beta=args.beta,
+                                       cutoff_top_n=args.cutoff_top_n, cutoff_prob=args.cutoff_prob,
+                                       beam_width=args.beam_width, num_processes=args.lm_workers,
+                                       blank_index=labels.index('_'))
     elif args.decoder == "greedy":
         decoder = GreedyDecoder(labels, blank_index=labels.index('_'))
     else:
         decoder = None
     target_decoder = GreedyDecoder(labels, blank_index=labels.index('_'))
-    test_dataset = SpectrogramDataset(audio_conf=audio_conf, manifest_filepath=args.test_manifest, labels=labels,
-                                      normalize=True)
+    if is_packed_dataset(args.test_manifest):
+        test_dataset = PackedSpectrogramDataset(audio_conf=audio_conf, packed_dir=args.test_manifest, labels=labels,
+                                                normalize=True)
+    else:
+        test_dataset = SpectrogramDataset(audio_conf=audio_conf, manifest_filepath=args.test_manifest, labels=labels,
+                                          normalize=True, feature_cache_dir=args.feature_cache_dir)
     test_loader = AudioDataLoader(test_dataset, batch_size=args.batch_size,
                                   num_workers=args.num_workers)
     total_cer, total_wer = 0, 0
@@ -76,10 +90,10 @@ if __name__ == '__main__':
         if args.cuda:
             inputs = inputs.cuda()
 
-        out = model(inputs)
+        input_sizes = input_percentages.mul_(int(inputs.size(3))).round().int()
+        out, sizes = model(inputs, input_sizes)
         out = out.transpose(0, 1)  # TxNxH
-        seq_length = out.size(0)
-        sizes = input_percentages.mul_(int(seq_length)).int()
+        sizes = sizes.cpu()
 
         if decoder is None:
             # add output to data array, and continue
@@ -103,6 +117,7 @@ if __name__ == '__main__':
         total_wer += wer
 
     if decoder is not None:
+        decoder.close()
         wer = total_wer / len(test_loader.dataset)
         cer = total_cer / len(test_loader.dataset)
 
@@ -5,20 +5,29 @@ import os
 import time
 
 import torch
+import torch.distributed as dist
 from tqdm import tqdm
 from torch.autograd import Variable
-from warpctc_pytorch import CTCLoss
-from data.data_loader import AudioDataLoader, SpectrogramDataset, BucketingSampler
+from data.data_loader import AudioDataLoader, SpectrogramDataset, BucketingSampler, DynamicBucketingSampler, \
+    DistributedBucketingSampler, augment_backends, _collate_fn
+from data.packed_dataset import PackedSpectrogramDataset, is_packed_dataset
 from decoder import GreedyDecoder
-from model import DeepSpeech, supported_rnns
+from loss import get_loss, loss_backends
+from checkpoint import AsyncCheckpointWriter
+from model import DeepSpeech, SpectrogramFrontend, load_package, supported_rnns, unwrap_model
+from profiling import TrainingProfiler, profile_data_pipeline
 
 parser = argparse.ArgumentParser(description='DeepSpeech training')
 parser.add_argument('--train-manifest', metavar='DIR',
-                    help='path to train manifest csv', default='data/train_manifest.csv')
+                    help='path to train manifest csv or packed dataset directory', default='data/train_manifest.csv')
 parser.add_argument('--val-manifest', metavar='DIR',
-                    help='path to validation manifest csv', default='data/val_manifest.csv')
+                    help='path to validation manifest csv or packed dataset directory',
+                    default='data/val_manifest.csv')
 parser.add_argument('--sample-rate', default=16000, type=int, help='Sample rate')
 parser.add_argument('--batch-size', default=20, type=int, help='Batch size for training')
+parser.add_argument('--batch-frames', default=0, type=int,
+                    help='Form training batches of varying size within a budget of padded spectrogram frames instead '
+                         'of using a fixed batch size. Requires a manifest with durations. 0 means fixed batch size')
 parser.add_argument('--num-workers', default=4, type=int, help='Number of workers used in data-loading')
 parser.add_argument('--labels-path', default='labels.json', help='Contains all characters for transcription')
 parser.add_argument('--window-size', default=.02, type=float, help='Window size for spectrogram in seconds')
@@ -35,7 +44,14 @@ parser.add_argument('--max-norm', default=400, type=int, help='Norm cutoff to pr
 parser.add_argument('--learning-anneal', default=1.1, type=float, help='Annealing applied to learning rate every epoch')
 parser.add_argument('--silent', dest='silent', action='store_true', help='Turn off progress tracking per iteration')
 parser.add_argument('--checkpoint', dest='checkpoint', action='store_true', help='Enables checkpoint saving of model')
-parser.add_argument('--checkpoint-per-batch', default=0, type=int, help='Save checkpoint per batch. 0 means never save')
+parser.add_argument('--checkpoint-per-batch', default=0, type=int,
+                    help='Save checkpoint per batch. 0 means never save. With --accumulate-steps use a multiple of it, '
+                         'gradients accumulated since the last step are not saved')
+parser.add_argument('--async-checkpoint', dest='async_checkpoint', action='store_true',
+                    help='Write checkpoints on a background thread, training only waits for the previous write')
+parser.add_argument('--checkpoint-keep', default=0, type=int,
+                    help='Number of most recent epoch and batch checkpoints to keep, older ones are deleted. '
+                         '0 keeps all of them')
 parser.add_argument('--visdom', dest='visdom', action='store_true', help='Turn on visdom graphing')
 parser.add_argument('--tensorboard', dest='tensorboard', action='store_true', help='Turn on tensorboard graphing')
 parser.add_argument('--log-dir', default='visualize/deepspeech_final', help='Location of tensorboard log')
@@ -48,17 +64,57 @@ parser.add_argument('--continue-from', default='', help='Continue from checkpoin
 parser.add_argument('--finetune', dest='finetune', action='store_true',
                     help='Finetune the model from checkpoint "continue_from"')
 parser.add_argument('--augment', dest='augment', action='store_true', help='Use random tempo and gain perturbations.')
+parser.add_argument('--augment-backend', default='sox', choices=augment_backends,
+                    help='Apply augmentations with the sox utility or in process with numpy')
 parser.add_argument('--noise-dir', default=None,
                     help='Directory to inject noise into audio. If default, noise Inject not added')
+parser.add_argument('--noise-bank', dest='noise_bank', action='store_true',
+                    help='Load all noise files into shared memory once instead of cropping them with sox per sample')
 parser.add_argument('--noise-prob', default=0.4, help='Probability of noise being added per sample')
 parser.add_argument('--noise-min', default=0.0,
                     help='Minimum noise level to sample from. (1.0 means all noise, not original signal)', type=float)
 parser.add_argument('--noise-max', default=0.5,
                     help='Maximum noise levels to sample from. Maximum 1.0', type=float)
+parser.add_argument('--feature-cache-dir', default=None,
+                    help='Directory to cache spectrograms in. Samples without augmentation or noise are only '
+                         'decoded and transformed once')
+parser.add_argument('--batched-frontend', dest='batched_frontend', action='store_true',
+                    help='Load raw audio and compute spectrograms per batch on the training device')
 parser.add_argument('--no-shuffle', dest='no_shuffle', action='store_true',
                     help='Turn off shuffling and sample from dataset based on sequence length (smallest to largest)')
 parser.add_argument('--no-bidirectional', dest='bidirectional', action='store_false', default=True,
                     help='Turn off bi-directional RNNs, introduces lookahead convolution')
+profile_args = parser.add_argument_group("Profiling Options", "Time the phases of each training iteration")
+profile_args.add_argument('--profile-path', default=None,
+                          help='JSONL file to write phase time percentiles, throughput and data loader stalls to. '
+                               'Profiling is off if not set')
+profile_args.add_argument('--profile-interval', default=50, type=int, help='Number of iterations per profiling record')
+profile_args.add_argument('--profile-stall-fraction', default=0.1, type=float,
+                          help='Count an iteration as stalled on data loading if waiting for the batch takes more '
+                               'than this fraction of it')
+profile_args.add_argument('--profile-data-samples', default=20, type=int,
+                          help='Number of samples to time the data loading steps on before training, 0 to skip')
+profile_args.add_argument('--profile-trace', default=None, type=int, nargs=2, metavar=('START', 'END'),
+                          help='Record a torch profiler trace of iterations START to END of the first epoch')
+profile_args.add_argument('--profile-trace-path', default='trace.json', help='Where to write the chrome trace')
+parser.add_argument('--world-size', default=1, type=int, help='Number of distributed processes')
+parser.add_argument('--rank', default=0, type=int, help='The rank of this process')
+parser.add_argument('--dist-url', default='tcp://127.0.0.1:1550', type=str,
+                    help='url used to set up distributed training')
+parser.add_argument('--dist-backend', default='gloo', type=str, help='distributed backend')
+parser.add_argument('--loss-backend', default='warpctc', choices=loss_backends,
+                    help='CTC loss implementation, the warp-ctc bindings or the one built into PyTorch')
+parser.add_argument('--accumulate-steps', default=1, type=int,
+                    help='Number of batches whose gradients are accumulated into one optimizer step. Gradients are '
+                         'averaged over all samples of the step before clipping')
+parser.add_argument('--rnn-checkpointing', dest='rnn_checkpointing', action='store_true',
+                    help='Recompute the activations of each RNN layer in the backward pass to save memory')
+parser.add_argument('--mixed-precision', dest='mixed_precision', action='store_true',
+                    help='Run the model under autocast with dynamic loss scaling, the CTC loss stays in float32')
+parser.add_argument('--amp-dtype', default=None, choices=['float16', 'bfloat16'],
+                    help='Data type of mixed precision, defaults to float16 with cuda and bfloat16 on the CPU')
+parser.add_argument('--gpu-rank', default=None, type=int, help='If using distributed parallel for multi-gpu, sets the '
+                                                               'GPU for the process')
 
 torch.manual_seed(123456)
 torch.cuda.manual_seed_all(123456)
@@ -68,6 +124,34 @@ def to_np(x):
     return x.data.cpu().numpy()
 
 
+def reduce_sum(values):
+    """
+    Sums a list of numbers over all distributed processes.
+    """
+    tensor = torch.DoubleTensor([float(value) for value in values])
+    dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor.tolist()
+
+
+def batched_features(frontend, audio, lengths, cuda=False):
+    """
+    Computes the spectrograms of a batch of raw audio with the frontend.
+    Returns them with their input percentages, as the default collate function does.
+    """
+    if cuda:
+        audio = audio.cuda()
+    spect, frame_lengths = frontend(audio, lengths)
+    return spect, frame_lengths.cpu().float() / spect.size(3)
+
+
+def autocast(args):
+    """
+    Returns the autocast context of --mixed-precision, which does nothing when mixed precision is off.
+    """
+    return torch.autocast('cuda' if args.cuda else 'cpu', dtype=getattr(torch, args.amp_dtype),
+                          enabled=args.mixed_precision)
+
+
 class AverageMeter(object):
     """Computes and stores the average and current value"""
 
@@ -90,18 +174,29 @@ class AverageMeter(object):
 if __name__ == '__main__':
     args = parser.parse_args()
     save_folder = args.save_folder
+    args.distributed = args.world_size > 1
+    main_proc = args.rank == 0  # Only the first process logs and saves checkpoints
+    if args.amp_dtype is None:
+        args.amp_dtype = 'float16' if args.cuda else 'bfloat16'
+    # loss scaling is a no-op without mixed precision, the optimizer steps as before
+    scaler = torch.amp.GradScaler('cuda' if args.cuda else 'cpu', enabled=args.mixed_precision)
+    if args.distributed:
+        if args.cuda and args.gpu_rank is not None:
+            torch.cuda.set_device(args.gpu_rank)
+        dist.init_process_group(backend=args.dist_backend, init_method=args.dist_url,
+                                world_size=args.world_size, rank=args.rank)
 
     loss_results, cer_results, wer_results = torch.Tensor(args.epochs), torch.Tensor(args.epochs), torch.Tensor(
         args.epochs)
     best_wer = None
-    if args.visdom:
+    if args.visdom and main_proc:
         from visdom import Visdom
 
         viz = Visdom()
         opts = dict(title=args.id, ylabel='', xlabel='Epoch', legend=['Loss', 'WER', 'CER'])
         viz_window = None
         epochs = torch.arange(1, args.epochs + 1)
-    if args.tensorboard:
+    if args.tensorboard and main_proc:
         try:
             os.makedirs(args.log_dir)
         except OSError as e:
@@ -127,12 +222,12 @@ if __name__ == '__main__':
             print('Model Save directory already exists.')
         else:
             raise
-    criterion = CTCLoss()
+    criterion = get_loss(args.loss_backend)
 
     avg_loss, start_epoch, start_iter = 0, 0, 0
     if args.continue_from:  # Starting from previous model
         print("Loading checkpoint model %s" % args.continue_from)
-        package = torch.load(args.continue_from, map_location=lambda storage, loc: storage)
+        package = load_package(args.continue_from)
         model = DeepSpeech.load_model_package(package)
         labels = DeepSpeech.get_labels(model)
         audio_conf = DeepSpeech.get_audio_conf(model)
@@ -150,6 +245,8 @@ if __name__ == '__main__':
                         if torch.is_tensor(v):
                             state[k] = v.cuda()
 
+            if args.mixed_precision and package.get('amp_state') is not None:
+                scaler.load_state_dict(package['amp_state'])
             start_epoch = int(package.get('epoch', 1)) - 1  # Index start at 0 for training
             start_iter = package.get('iteration', None)
             if start_iter is None:
@@ -160,7 +257,7 @@ if __name__ == '__main__':
             avg_loss = int(package.get('avg_loss', 0))
             loss_results, cer_results, wer_results = package['loss_results'], package[
                 'cer_results'], package['wer_results']
-            if args.visdom and \
+            if main_proc and args.visdom and \
                             package[
                                 'loss_results'] is not None and start_epoch > 0:  # Add previous scores to visdom graph
                 x_axis = epochs[0:start_epoch]
@@ -172,7 +269,7 @@ if __name__ == '__main__':
                     Y=y_axis,
                     opts=opts,
                 )
-            if args.tensorboard and \
+            if main_proc and args.tensorboard and \
                             package[
                                 'loss_results'] is not None and start_epoch > 0:  # Previous scores to tensorboard logs
                 for i in range(start_epoch):
@@ -192,6 +289,7 @@ if __name__ == '__main__':
                           window=args.window,
                           noise_dir=args.noise_dir,
                           noise_prob=args.noise_prob,
+                          noise_bank=args.noise_bank,
                           noise_levels=(args.noise_min, args.noise_max))
 
         rnn_type = args.rnn_type.lower()
@@ -207,73 +305,152 @@ if __name__ == '__main__':
                                     momentum=args.momentum, nesterov=True)
 
     decoder = GreedyDecoder(labels)
-    train_dataset = SpectrogramDataset(audio_conf=audio_conf, manifest_filepath=args.train_manifest, labels=labels,
-                                       normalize=True, augment=args.augment)
-    test_dataset = SpectrogramDataset(audio_conf=audio_conf, manifest_filepath=args.val_manifest, labels=labels,
-                                      normalize=True, augment=False)
-    train_sampler = BucketingSampler(train_dataset, batch_size=args.batch_size)
+    if is_packed_dataset(args.train_manifest):
+        train_dataset = PackedSpectrogramDataset(audio_conf=audio_conf, packed_dir=args.train_manifest, labels=labels,
+                                                 normalize=True, augment=args.augment, raw_audio=args.batched_frontend)
+    else:
+        train_dataset = SpectrogramDataset(audio_conf=audio_conf, manifest_filepath=args.train_manifest,
+                                           labels=labels, normalize=True, augment=args.augment,
+                                           feature_cache_dir=args.feature_cache_dir,
+                                           augment_backend=args.augment_backend, raw_audio=args.batched_frontend)
+    if is_packed_dataset(args.val_manifest):
+        test_dataset = PackedSpectrogramDataset(audio_conf=audio_conf, packed_dir=args.val_manifest, labels=labels,
+                                                normalize=True, augment=False, raw_audio=args.batched_frontend)
+    else:
+        test_dataset = SpectrogramDataset(audio_conf=audio_conf, manifest_filepath=args.val_manifest, labels=labels,
+                                          normalize=True, augment=False, feature_cache_dir=args.feature_cache_dir,
+                                          raw_audio=args.batched_frontend)
+    if args.batch_frames > 0:
+        train_sampler = DynamicBucketingSampler(train_dataset, max_frames=args.batch_frames)
+    else:
+        train_sampler = BucketingSampler(train_dataset, batch_size=args.batch_size)
+    if args.distributed:
+        train_sampler = DistributedBucketingSampler(train_sampler, num_replicas=args.world_size, rank=args.rank)
+        # every process validates its own share of the batches, results are summed over processes afterwards
+        test_sampler = DistributedBucketingSampler(BucketingSampler(test_dataset, batch_size=args.batch_size),
+                                                   num_replicas=args.world_size, rank=args.rank, pad=False)
+        test_loader = AudioDataLoader(test_dataset, num_workers=args.num_workers, batch_sampler=test_sampler)
+    else:
+        test_loader = AudioDataLoader(test_dataset, batch_size=args.batch_size,
+                                      num_workers=args.num_workers)
     train_loader = AudioDataLoader(train_dataset,
                                    num_workers=args.num_workers, batch_sampler=train_sampler)
-    test_loader = AudioDataLoader(test_dataset, batch_size=args.batch_size,
-                                  num_workers=args.num_workers)
 
     if not args.no_shuffle and start_epoch != 0:
         print("Shuffling batches for the following epochs")
-        train_sampler.shuffle()
+        train_sampler.shuffle(start_epoch)
+    train_sampler.set_start_iter(start_iter)
 
+    if args.rnn_checkpointing:
+        model.set_rnn_checkpointing()
     if args.cuda:
-        model = torch.nn.DataParallel(model).cuda()
-
-    print(model)
-    print("Number of parameters: %d" % DeepSpeech.get_param_size(model))
+        model = model.cuda()
+    if args.distributed:
+        device_ids = [args.gpu_rank] if args.cuda and args.gpu_rank is not None else None
+        model = torch.nn.parallel.DistributedDataParallel(model, device_ids=device_ids)
+    elif args.cuda:
+        model = torch.nn.DataParallel(model)
+    frontend = SpectrogramFrontend(audio_conf, normalize=True) if args.batched_frontend else None
+    if frontend is not None and args.cuda:
+        frontend = frontend.cuda()
+
+    if main_proc:
+        print(model)
+        print("Number of parameters: %d" % DeepSpeech.get_param_size(model))
 
     batch_time = AverageMeter()
     data_time = AverageMeter()
     losses = AverageMeter()
 
+    checkpoint_writer = AsyncCheckpointWriter(keep=args.checkpoint_keep, asynchronous=args.async_checkpoint)
+    profile_path = args.profile_path
+    if profile_path is not None and args.distributed:
+        profile_path = '%s.rank%d' % (profile_path, args.rank)
+    profiler = TrainingProfiler(profile_path, cuda=args.cuda, interval=args.profile_interval,
+                                stall_fraction=args.profile_stall_fraction,
+                                trace_start=args.profile_trace[0] if args.profile_trace else None,
+                                trace_end=args.profile_trace[1] if args.profile_trace else None,
+                                trace_path=args.profile_trace_path)
+    if profiler.enabled and args.profile_data_samples > 0 and isinstance(train_dataset, SpectrogramDataset):
+        # the data loader workers run these steps, compare their time per batch over the workers with the phases
+        data_steps = profile_data_pipeline(train_dataset, _collate_fn, num_samples=args.profile_data_samples,
+                                           batch_size=args.batch_size)
+        profiler.write({'data_pipeline': data_steps, 'num_workers': args.num_workers})
+        if main_proc:
+            print("Data loading per sample: " + ', '.join('%s %.4fs' % step for step in sorted(data_steps.items())))
+    profile_window = None
+
     for epoch in range(start_epoch, args.epochs):
         model.train()
         end = time.time()
-        for i, (data) in enumerate(train_loader, start=start_iter):
+        optimizer.zero_grad()
+        step_samples = 0  # samples whose gradients were accumulated since the last optimizer step
+        train_iterator = iter(train_loader)
+        for i, (data) in enumerate(train_iterator, start=start_iter):
             if i == len(train_sampler):
                 break
             inputs, targets, input_percentages, target_sizes = data
             # measure data loading time
             data_time.update(time.time() - end)
+            profiler.begin_iteration(i + 1)
+            profiler.add('data', data_time.val)
+            if frontend is not None:
+                with profiler.phase('frontend'):
+                    inputs, input_percentages = batched_features(frontend, inputs, input_percentages, args.cuda)
             inputs = Variable(inputs, requires_grad=False)
             target_sizes = Variable(target_sizes, requires_grad=False)
             targets = Variable(targets, requires_grad=False)
 
             if args.cuda:
-                inputs = inputs.cuda()
+                with profiler.phase('copy'):
+                    inputs = inputs.cuda()
 
-            out = model(inputs)
-            out = out.transpose(0, 1)  # TxNxH
+            input_sizes = input_percentages.mul_(int(inputs.size(3))).round().int()
+            with profiler.phase('forward'):
+                with autocast(args):
+                    out, sizes = model(inputs, input_sizes)
+                out = out.transpose(0, 1).float()  # TxNxH, the CTC loss is computed in float32
+            sizes = Variable(sizes.cpu(), requires_grad=False)
 
-            seq_length = out.size(0)
-            sizes = Variable(input_percentages.mul_(int(seq_length)).int(), requires_grad=False)
+            with profiler.phase('loss'):
+                loss = criterion(out, targets, sizes, target_sizes)
+            batch_loss = loss / inputs.size(0)  # average the loss by minibatch
 
-            loss = criterion(out, targets, sizes, target_sizes)
-            loss = loss / inputs.size(0)  # average the loss by minibatch
-
-            loss_sum = loss.data.sum()
+            loss_sum = batch_loss.data.sum()
             inf = float("inf")
             if loss_sum == inf or loss_sum == -inf:
                 print("WARNING: received an inf loss, setting loss value to 0")
                 loss_value = 0
             else:
-                loss_value = loss.data[0]
+                loss_value = batch_loss.data[0]
 
             avg_loss += loss_value
             losses.update(loss_value, inputs.size(0))
 
-            # compute gradient
-            optimizer.zero_grad()
-            loss.backward()
-
-            torch.nn.utils.clip_grad_norm(model.parameters(), args.max_norm)
-            # SGD step
-            optimizer.step()
+            # compute gradient of the summed loss, it is averaged over the samples of all accumulated batches below
+            step = (i + 1) % args.accumulate_steps == 0 or i + 1 == len(train_sampler)
+            with profiler.phase('backward'):
+                if args.distributed and not step:
+                    with model.no_sync():  # gradients are only all-reduced on the last batch of a step
+                        scaler.scale(loss).backward()
+                else:
+                    scaler.scale(loss).backward()
+            step_samples += inputs.size(0)
+
+            if step:
+                with profiler.phase('optimizer'):
+                    # gradients are unscaled and averaged before clipping, so the norm cutoff applies to the gradient
+                    # of the mean loss over the whole step
+                    scaler.unscale_(optimizer)
+                    for param in model.parameters():
+                        if param.grad is not None:
+                            param.grad.data.div_(step_samples)
+                    torch.nn.utils.clip_grad_norm(model.parameters(), args.max_norm)
+                    # SGD step, skipped by the scaler if the gradients contain infs or NaNs
+                    scaler.step(optimizer)
+                    scaler.update()
+                    optimizer.zero_grad()
+                step_samples = 0
 
             if args.cuda:
                 torch.cuda.synchronize()
@@ -281,77 +458,114 @@ if __name__ == '__main__':
             # measure elapsed time
             batch_time.update(time.time() - end)
             end = time.time()
-            if not args.silent:
+            audio_seconds = float(input_sizes.sum()) * audio_conf['window_stride']
+            profiler.record_iteration(i + 1, inputs.size(0), audio_seconds, data_time.val, batch_time.val,
+                                      train_iterator)
+            if profiler.should_log():
+                record = profiler.log(epoch + 1, i + 1)
+                global_step = epoch * len(train_sampler) + i + 1
+                if args.tensorboard and main_proc:
+                    tensorboard_writer.add_scalars(args.id + '/phase_p50', dict(
+                        (name, times['p50']) for name, times in record['phases'].items()), global_step)
+                    tensorboard_writer.add_scalars(args.id + '/throughput', {
+                        'samples/s': record['samples_per_second'],
+                        'audio s/s': record['audio_seconds_per_second'],
+                        'loader stalls': record['loader_stalls']
+                    }, global_step)
+                if args.visdom and main_proc:
+                    profile_values = torch.Tensor([[record['samples_per_second'],
+                                                    record['audio_seconds_per_second'],
+                                                    record['loader_stalls']]])
+                    profile_window = viz.line(X=torch.Tensor([global_step]), Y=profile_values, win=profile_window,
+                                              update='append' if profile_window is not None else None,
+                                              opts=dict(title=args.id + ' throughput', xlabel='Iteration',
+                                                        legend=['Samples/s', 'Audio s/s', 'Loader stalls']))
+            if not args.silent and main_proc:
                 print('Epoch: [{0}][{1}/{2}]\t'
                       'Time {batch_time.val:.3f} ({batch_time.avg:.3f})\t'
                       'Data {data_time.val:.3f} ({data_time.avg:.3f})\t'
                       'Loss {loss.val:.4f} ({loss.avg:.4f})\t'.format(
                     (epoch + 1), (i + 1), len(train_sampler), batch_time=batch_time,
                     data_time=data_time, loss=losses))
-            if args.checkpoint_per_batch > 0 and i > 0 and (i + 1) % args.checkpoint_per_batch == 0:
+            if args.checkpoint_per_batch > 0 and i > 0 and (i + 1) % args.checkpoint_per_batch == 0 and main_proc:
                 file_path = '%s/deepspeech_checkpoint_epoch_%d_iter_%d.pth.tar' % (save_folder, epoch + 1, i + 1)
                 print("Saving checkpoint model to %s" % file_path)
-                torch.save(DeepSpeech.serialize(model, optimizer=optimizer, epoch=epoch, iteration=i,
-                                                loss_results=loss_results,
-                                                wer_results=wer_results, cer_results=cer_results, avg_loss=avg_loss),
-                           file_path)
+                checkpoint_writer.save(DeepSpeech.serialize(model, optimizer=optimizer, epoch=epoch, iteration=i,
+                                                            loss_results=loss_results, wer_results=wer_results,
+                                                            cer_results=cer_results, avg_loss=avg_loss,
+                                                            amp_state=scaler.state_dict() if args.mixed_precision
+                                                            else None),
+                                       file_path)
             del loss
+            del batch_loss
             del out
         avg_loss /= len(train_sampler)
+        if args.distributed:
+            avg_loss = reduce_sum([avg_loss])[0] / args.world_size
 
-        print('Training Summary Epoch: [{0}]\t'
-              'Average Loss {loss:.3f}\t'.format(
-            epoch + 1, loss=avg_loss))
+        if main_proc:
+                print('Training Summary Epoch: [{0}]\t'
+                  'Average Loss {loss:.3f}\t'.format(
+                epoch + 1, loss=avg_loss))
 
         start_iter = 0  # Reset start iteration for next epoch
-        total_cer, total_wer = 0, 0
+        total_cer, total_wer, num_samples = 0, 0, 0
         model.eval()
-        for i, (data) in tqdm(enumerate(test_loader), total=len(test_loader)):
-            inputs, targets, input_percentages, target_sizes = data
-
-            inputs = Variable(inputs, volatile=True)
-
-            # unflatten targets
-            split_targets = []
-            offset = 0
-            for size in target_sizes:
-                split_targets.append(targets[offset:offset + size])
-                offset += size
-
-            if args.cuda:
-                inputs = inputs.cuda()
-
-            out = model(inputs)
-            out = out.transpose(0, 1)  # TxNxH
-            seq_length = out.size(0)
-            sizes = input_percentages.mul_(int(seq_length)).int()
-
-            decoded_output, _ = decoder.decode(out.data, sizes)
-            target_strings = decoder.convert_to_strings(split_targets)
-            wer, cer = 0, 0
-            for x in range(len(target_strings)):
-                transcript, reference = decoded_output[x][0], target_strings[x][0]
-                wer += decoder.wer(transcript, reference) / float(len(reference.split()))
-                cer += decoder.cer(transcript, reference) / float(len(reference))
-            total_cer += cer
-            total_wer += wer
-
-            if args.cuda:
-                torch.cuda.synchronize()
-            del out
-        wer = total_wer / len(test_loader.dataset)
-        cer = total_cer / len(test_loader.dataset)
+        # DistributedDataParallel broadcasts buffers in every forward, which hangs when processes validate different
+        # numbers of batches. DataParallel is kept to validate on all GPUs
+        eval_model = unwrap_model(model) if args.distributed else model
+        with torch.no_grad():
+            for i, (data) in tqdm(enumerate(test_loader), total=len(test_loader), disable=not main_proc):
+                inputs, targets, input_percentages, target_sizes = data
+                if frontend is not None:
+                    inputs, input_percentages = batched_features(frontend, inputs, input_percentages, args.cuda)
+
+                # unflatten targets
+                split_targets = []
+                offset = 0
+                for size in target_sizes:
+                    split_targets.append(targets[offset:offset + size])
+                    offset += size
+
+                if args.cuda:
+                    inputs = inputs.cuda()
+
+                input_sizes = input_percentages.mul_(int(inputs.size(3))).round().int()
+                with autocast(args):
+                    out, sizes = eval_model(inputs, input_sizes)
+                out = out.transpose(0, 1).float()  # TxNxH
+                sizes = sizes.cpu()
+
+                decoded_output, _ = decoder.decode(out.data, sizes)
+                target_strings = decoder.convert_to_strings(split_targets)
+                wer, cer = 0, 0
+                for x in range(len(target_strings)):
+                    transcript, reference = decoded_output[x][0], target_strings[x][0]
+                    wer += decoder.wer(transcript, reference) / float(len(reference.split()))
+                    cer += decoder.cer(transcript, reference) / float(len(reference))
+                total_cer += cer
+                total_wer += wer
+                num_samples += len(target_strings)
+
+                if args.cuda:
+                    torch.cuda.synchronize()
+                del out
+        if args.distributed:
+            total_wer, total_cer, num_samples = reduce_sum([total_wer, total_cer, num_samples])
+        wer = total_wer / num_samples
+        cer = total_cer / num_samples
         wer *= 100
         cer *= 100
         loss_results[epoch] = avg_loss
         wer_results[epoch] = wer
         cer_results[epoch] = cer
-        print('Validation Summary Epoch: [{0}]\t'
-              'Average WER {wer:.3f}\t'
-              'Average CER {cer:.3f}\t'.format(
-            epoch + 1, wer=wer, cer=cer))
+        if main_proc:
+            print('Validation Summary Epoch: [{0}]\t'
+                  'Average WER {wer:.3f}\t'
+                  'Average CER {cer:.3f}\t'.format(
+                epoch + 1, wer=wer, cer=cer))
 
-        if args.visdom:
+        if args.visdom and main_proc:
             x_axis = epochs[0:epoch + 1]
             y_axis = torch.stack((loss_results[0:epoch + 1], wer_results[0:epoch + 1], cer_results[0:epoch + 1]), dim=1)
             if viz_window is None:
@@ -367,7 +581,7 @@ if __name__ == '__main__':
                     win=viz_window,
                     update='replace',
                 )
-        if args.tensorboard:
+        if args.tensorboard and main_proc:
             values = {
                 'Avg Train Loss': avg_loss,
                 'Avg WER': wer,
@@ -379,25 +593,34 @@ if __name__ == '__main__':
                     tag = tag.replace('.', '/')
                     tensorboard_writer.add_histogram(tag, to_np(value), epoch + 1)
                     tensorboard_writer.add_histogram(tag + '/grad', to_np(value.grad), epoch + 1)
-        if args.checkpoint:
+        if args.checkpoint and main_proc:
             file_path = '%s/deepspeech_%d.pth.tar' % (save_folder, epoch + 1)
-            torch.save(DeepSpeech.serialize(model, optimizer=optimizer, epoch=epoch, loss_results=loss_results,
-                                            wer_results=wer_results, cer_results=cer_results),
-                       file_path)
+            checkpoint_writer.save(DeepSpeech.serialize(model, optimizer=optimizer, epoch=epoch,
+                                                        loss_results=loss_results, wer_results=wer_results,
+                                                        cer_results=cer_results,
+                                                        amp_state=scaler.state_dict() if args.mixed_precision
+                                                        else None),
+                                   file_path)
         # anneal lr
         optim_state = optimizer.state_dict()
         optim_state['param_groups'][0]['lr'] = optim_state['param_groups'][0]['lr'] / args.learning_anneal
         optimizer.load_state_dict(optim_state)
-        print('Learning rate annealed to: {lr:.6f}'.format(lr=optim_state['param_groups'][0]['lr']))
+        if main_proc:
+            print('Learning rate annealed to: {lr:.6f}'.format(lr=optim_state['param_groups'][0]['lr']))
 
-        if best_wer is None or best_wer > wer:
+        if (best_wer is None or best_wer > wer) and main_proc:
             print("Found better validated model, saving to %s" % args.model_path)
-            torch.save(DeepSpeech.serialize(model, optimizer=optimizer, epoch=epoch, loss_results=loss_results,
-                                            wer_results=wer_results, cer_results=cer_results)
-                       , args.model_path)
+            checkpoint_writer.save(DeepSpeech.serialize(model, optimizer=optimizer, epoch=epoch,
+                                                        loss_results=loss_results, wer_results=wer_results,
+                                                        cer_results=cer_results,
+                                                        amp_state=scaler.state_dict() if args.mixed_precision
+                                                        else None),
+                                   args.model_path, retain=False)
             best_wer = wer
 
         avg_loss = 0
         if not args.no_shuffle:
-            print("Shuffling batches...")
-            train_sampler.shuffle()
+            if main_proc:
+                print("Shuffling batches...")
+            train_sampler.shuffle(epoch + 1)
+    checkpoint_writer.close()
@@ -1,3 +1,5 @@
+from __future__ import print_function
+
 import argparse
 import warnings
 
@@ -5,12 +7,43 @@ warnings.simplefilter('ignore')
 
 from decoder import GreedyDecoder
 
-from torch.autograd import Variable
+import torch
 
-from data.data_loader import SpectrogramParser
+from data.data_loader import AudioDataLoader, AudioFileDataset, SpectrogramParser, load_audio
+from data.utils import DurationIndex
 from model import DeepSpeech
+import fnmatch
+import glob
 import os.path
 import json
+import sys
+import time
+
+
+def add_decoder_args(parser):
+    """
+    Adds the options of load_decoder and decode_results to an argument parser.
+    """
+    parser.add_argument('--decoder', default="greedy", choices=["greedy", "beam", "prefix_beam"], type=str,
+                        help="Decoder to use")
+    parser.add_argument('--offsets', dest='offsets', action='store_true', help='Returns time offset information')
+    beam_args = parser.add_argument_group("Beam Decode Options",
+                                          "Configurations options for the CTC Beam Search decoder")
+    beam_args.add_argument('--top-paths', default=1, type=int, help='number of beams to return')
+    beam_args.add_argument('--beam-width', default=10, type=int, help='Beam width to use')
+    beam_args.add_argument('--lm-path', default=None, type=str,
+                           help='Path to an (optional) kenlm language model for use with beam search '
+                                '(req\'d with trie)')
+    beam_args.add_argument('--alpha', default=0.8, type=float, help='Language model weight')
+    beam_args.add_argument('--beta', default=1, type=float, help='Language model word bonus (all words)')
+    beam_args.add_argument('--cutoff-top-n', default=40, type=int,
+                           help='Cutoff number in pruning, only top cutoff_top_n characters with highest probs in '
+                                'vocabulary will be used in beam search, default 40.')
+    beam_args.add_argument('--cutoff-prob', default=1.0, type=float,
+                           help='Cutoff probability in pruning,default 1.0, no pruning.')
+    beam_args.add_argument('--lm-workers', default=1, type=int, help='Number of LM processes to use')
+    return parser
+
 
 parser = argparse.ArgumentParser(description='DeepSpeech transcription')
 parser.add_argument('--model-path', default='models/deepspeech_final.pth',
@@ -18,25 +51,49 @@ parser.add_argument('--model-path', default='models/deepspeech_final.pth',
 parser.add_argument('--audio-path', default='audio.wav',
                     help='Audio file to predict on')
 parser.add_argument('--cuda', action="store_true", help='Use cuda to test model')
-parser.add_argument('--decoder', default="greedy", choices=["greedy", "beam"], type=str, help="Decoder to use")
-parser.add_argument('--offsets', dest='offsets', action='store_true', help='Returns time offset information')
-beam_args = parser.add_argument_group("Beam Decode Options", "Configurations options for the CTC Beam Search decoder")
-beam_args.add_argument('--top-paths', default=1, type=int, help='number of beams to return')
-beam_args.add_argument('--beam-width', default=10, type=int, help='Beam width to use')
-beam_args.add_argument('--lm-path', default=None, type=str,
-                       help='Path to an (optional) kenlm language model for use with beam search (req\'d with trie)')
-beam_args.add_argument('--alpha', default=0.8, type=float, help='Language model weight')
-beam_args.add_argument('--beta', default=1, type=float, help='Language model word bonus (all words)')
-beam_args.add_argument('--cutoff-top-n', default=40, type=int,
-                       help='Cutoff number in pruning, only top cutoff_top_n characters with highest probs in '
-                            'vocabulary will be used in beam search, default 40.')
-beam_args.add_argument('--cutoff-prob', default=1.0, type=float,
-                       help='Cutoff probability in pruning,default 1.0, no pruning.')
-beam_args.add_argument('--lm-workers', default=1, type=int, help='Number of LM processes to use')
-args = parser.parse_args()
-
-
-def decode_results(model, decoded_output, decoded_offsets):
+stream_args = parser.add_argument_group("Streaming Options", "Transcribe chunk by chunk with a unidirectional model")
+stream_args.add_argument('--stream', dest='stream', action='store_true',
+                         help='Feed the audio to the model in chunks, printing partial transcripts to stderr. '
+                              'Requires a model trained with --no-bidirectional and the greedy decoder')
+stream_args.add_argument('--chunk-size', default=0.5, type=float, help='Length of each streamed chunk in seconds')
+long_form_args = parser.add_argument_group("Long-form Options", "Transcribe long audio in batched segments")
+long_form_args.add_argument('--long-form', dest='long_form', action='store_true',
+                            help='Split the audio into segments that are transcribed in batches and stitched together')
+long_form_args.add_argument('--segment-mode', default='silence', choices=['silence', 'window'],
+                            help='Cut segments at the quietest points or use overlapping windows')
+long_form_args.add_argument('--max-segment', default=15.0, type=float, help='Maximum segment length in seconds')
+long_form_args.add_argument('--segment-overlap', default=2.0, type=float,
+                            help='Overlap between windows in seconds, for --segment-mode window')
+long_form_args.add_argument('--batch-size', default=8, type=int,
+                            help='Number of segments, or files in bulk mode, transcribed at once')
+bulk_args = parser.add_argument_group("Bulk Options", "Transcribe many files with one model load")
+bulk_args.add_argument('--input', default=None,
+                       help='Directory of wav files, glob pattern or manifest csv to transcribe instead of '
+                            '--audio-path')
+bulk_args.add_argument('--output-path', default=None,
+                       help='File to write one json line per transcribed file to, defaults to stdout')
+bulk_args.add_argument('--num-workers', default=4, type=int, help='Number of workers computing spectrograms')
+add_decoder_args(parser)
+
+
+def load_decoder(labels, args):
+    if args.decoder == "beam":
+        from decoder import BeamCTCDecoder
+
+        return BeamCTCDecoder(labels, lm_path=args.lm_path, alpha=args.alpha, beta=args.beta,
+                              cutoff_top_n=args.cutoff_top_n, cutoff_prob=args.cutoff_prob,
+                              beam_width=args.beam_width, num_processes=args.lm_workers)
+    elif args.decoder == "prefix_beam":
+        from decoder import PrefixBeamCTCDecoder
+
+        return PrefixBeamCTCDecoder(labels, lm_path=args.lm_path, alpha=args.alpha, beta=args.beta,
+                                    cutoff_top_n=args.cutoff_top_n, cutoff_prob=args.cutoff_prob,
+                                    beam_width=args.beam_width, num_processes=args.lm_workers,
+                                    blank_index=labels.index('_'))
+    return GreedyDecoder(labels, blank_index=labels.index('_'))
+
+
+def decode_results(model, decoded_output, decoded_offsets, args):
     results = {
         "output": [],
         "_meta": {
@@ -60,32 +117,132 @@ def decode_results(model, decoded_output, decoded_offsets):
         for pi in range(min(args.top_paths, len(decoded_output[b]))):
             result = {'transcription': decoded_output[b][pi]}
             if args.offsets:
-                result['offsets'] = decoded_offsets[b][pi]
+                result['offsets'] = decoded_offsets[b][pi].tolist()
             results['output'].append(result)
     return results
 
 
+def transcribe_stream(model, audio_path, chunk_size, cuda=False):
+    """
+    Feeds the audio file to a StreamingTranscriber chunk by chunk, printing the transcript so far after every chunk.
+    :return: The decoded output and offsets in the format of the decoders
+    """
+    from streaming import StreamingTranscriber
+
+    transcriber = StreamingTranscriber(model, cuda=cuda)
+    y = load_audio(audio_path)
+    chunk_samples = max(int(chunk_size * DeepSpeech.get_audio_conf(model).get('sample_rate', 16000)), 1)
+    for start in range(0, len(y), chunk_samples):
+        if transcriber.feed(y[start:start + chunk_samples]):
+            print(transcriber.transcript, file=sys.stderr)
+    transcriber.finish()
+    return [[transcriber.transcript]], [[torch.IntTensor(transcriber.offsets)]]
+
+
+def list_audio_files(path):
+    """
+    :param path: Directory searched for wav files, a manifest csv whose first column is the audio path, or a glob
+    :return: List of audio paths
+    """
+    if os.path.isdir(path):
+        return sorted(os.path.join(dirpath, f)
+                      for dirpath, dirnames, files in os.walk(path)
+                      for f in fnmatch.filter(files, '*.wav'))
+    if path.endswith('.csv') and os.path.isfile(path):
+        with open(path) as manifest:
+            return [line.strip().split(',')[0] for line in manifest if line.strip()]
+    return sorted(glob.glob(path))
+
+
+def transcribe_files(model, decoder, audio_conf, audio_paths, durations, batch_size=8, num_workers=4, cuda=False):
+    """
+    Transcribes files in padded batches of similar length, longest first, computing the spectrograms in
+    num_workers processes.
+    :return: Generator of the audio path, decoded output and offsets of every file
+    """
+    order = sorted(range(len(audio_paths)), key=lambda i: durations[i], reverse=True)
+    batches = [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+    dataset = AudioFileDataset(audio_conf, audio_paths, normalize=True)
+    loader = AudioDataLoader(dataset, batch_sampler=batches, num_workers=num_workers)
+    for indices, (inputs, _, input_percentages, _) in zip(batches, loader):
+        if cuda:
+            inputs = inputs.cuda()
+        input_sizes = input_percentages.mul_(int(inputs.size(3))).round().int()
+        with torch.no_grad():
+            out, sizes = model(inputs, input_sizes)
+        out = out.transpose(0, 1)  # TxNxH
+        decoded_output, decoded_offsets = decoder.decode(out.data, sizes.cpu())
+        for x, i in enumerate(indices):
+            yield audio_paths[i], decoded_output[x], decoded_offsets[x]
+
+
+def transcribe_bulk(model, decoder, args):
+    """
+    Writes the transcription of every file of args.input as a json line and reports the real time factor of the run.
+    """
+    audio_paths = list_audio_files(args.input)
+    if not audio_paths:
+        raise ValueError("No audio files found in {}".format(args.input))
+    duration_index = DurationIndex()
+    duration_index.update(audio_paths, max(args.num_workers, 1), verbose=False)
+    durations = [duration_index.get(path)[0] for path in audio_paths]
+
+    output_file = open(args.output_path, 'w') if args.output_path else sys.stdout
+    start = time.time()
+    try:
+        for audio_path, output, offsets in transcribe_files(model, decoder, DeepSpeech.get_audio_conf(model),
+                                                            audio_paths, durations, args.batch_size,
+                                                            args.num_workers, args.cuda):
+            results = decode_results(model, [output], [offsets], args)
+            output_file.write(json.dumps({'audio_path': audio_path, 'output': results['output']}) + '\n')
+    finally:
+        if output_file is not sys.stdout:
+            output_file.close()
+    elapsed = time.time() - start
+    audio_duration = sum(durations)
+    print("Transcribed {} files, {:.1f}s of audio in {:.1f}s".format(len(audio_paths), audio_duration, elapsed),
+          end='', file=sys.stderr)
+    if audio_duration > 0:
+        print(", real time factor {:.4f}".format(elapsed / audio_duration), end='', file=sys.stderr)
+    print(file=sys.stderr)
+
+
 if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.stream and args.decoder != "greedy":
+        parser.error("Streaming only supports the greedy decoder")
     model = DeepSpeech.load_model(args.model_path, cuda=args.cuda)
     model.eval()
 
     labels = DeepSpeech.get_labels(model)
     audio_conf = DeepSpeech.get_audio_conf(model)
+    decoder = load_decoder(labels, args)
 
-    if args.decoder == "beam":
-        from decoder import BeamCTCDecoder
+    if args.input is not None:
+        transcribe_bulk(model, decoder, args)
+        decoder.close()
+        sys.exit(0)
+    if args.stream:
+        decoded_output, decoded_offsets = transcribe_stream(model, args.audio_path, args.chunk_size, args.cuda)
+    elif args.long_form:
+        from segmentation import transcribe_long_audio
 
-        decoder = BeamCTCDecoder(labels, lm_path=args.lm_path, alpha=args.alpha, beta=args.beta,
-                                 cutoff_top_n=args.cutoff_top_n, cutoff_prob=args.cutoff_prob,
-                                 beam_width=args.beam_width, num_processes=args.lm_workers)
+        parser = SpectrogramParser(audio_conf, normalize=True)
+        transcript, offsets = transcribe_long_audio(model, decoder, parser, load_audio(args.audio_path),
+                                                    mode=args.segment_mode, max_duration=args.max_segment,
+                                                    overlap_duration=args.segment_overlap,
+                                                    batch_size=args.batch_size, cuda=args.cuda)
+        decoded_output, decoded_offsets = [[transcript]], [[torch.IntTensor(offsets)]]
     else:
-        decoder = GreedyDecoder(labels, blank_index=labels.index('_'))
-
-    parser = SpectrogramParser(audio_conf, normalize=True)
+        parser = SpectrogramParser(audio_conf, normalize=True)
 
-    spect = parser.parse_audio(args.audio_path).contiguous()
-    spect = spect.view(1, 1, spect.size(0), spect.size(1))
-    out = model(Variable(spect, volatile=True))
-    out = out.transpose(0, 1)  # TxNxH
-    decoded_output, decoded_offsets = decoder.decode(out.data)
-    print(json.dumps(decode_results(model, decoded_output, decoded_offsets)))
+        spect = parser.parse_audio(args.audio_path).contiguous()
+        spect = spect.view(1, 1, spect.size(0), spect.size(1))
+        if args.cuda:
+            spect = spect.cuda()
+        with torch.no_grad():
+            out, sizes = model(spect, torch.IntTensor([spect.size(3)]))
+        out = out.transpose(0, 1)  # TxNxH
+        decoded_output, decoded_offsets = decoder.decode(out.data, sizes.cpu())
+    print(json.dumps(decode_results(model, decoded_output, decoded_offsets, args)))
+    decoder.close()
@@ -0,0 +1,100 @@
+from __future__ import print_function
+
+import argparse
+import json
+import threading
+import time
+
+import numpy as np
+from six.moves.urllib.request import Request, urlopen
+
+parser = argparse.ArgumentParser(description='Load generator for the DeepSpeech transcription server')
+parser.add_argument('--url', default='http://127.0.0.1:8888/transcribe', help='Transcription endpoint of server.py')
+parser.add_argument('--audio-path', nargs='+', default=['audio.wav'],
+                    help='Audio files to send, requests cycle through them')
+parser.add_argument('--requests', default=100, type=int, help='Total number of requests to send')
+parser.add_argument('--concurrency', default='1,4,16', type=str,
+                    help='Comma separated numbers of clients sending requests at the same time, one run each')
+parser.add_argument('--output-path', default=None, help='Write the statistics of every run to this json file')
+
+
+def send(url, audio):
+    request = Request(url, data=audio, headers={'Content-Type': 'audio/wav'})
+    return json.loads(urlopen(request).read().decode('utf-8'))
+
+
+def run(url, audio_files, num_requests, concurrency):
+    """
+    Sends num_requests requests from concurrency threads, each sending its next request as soon as the previous
+    one returned.
+    :return: Throughput and latency statistics of the run
+    """
+    latencies, server_latencies, errors = [], [], []
+    counter = iter(range(num_requests))
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.time()
+            try:
+                results = send(url, audio_files[i % len(audio_files)])
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies.append(time.time() - start)
+                server_latencies.append(results['_meta']['latency'])
+
+    start = time.time()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.time() - start
+
+    latencies = np.array(latencies) * 1000
+    stats = {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput': len(latencies) / duration
+    }
+    if len(latencies):
+        stats.update({
+            'latency_mean_ms': float(latencies.mean()),
+            'latency_p50_ms': float(np.percentile(latencies, 50)),
+            'latency_p90_ms': float(np.percentile(latencies, 90)),
+            'latency_p99_ms': float(np.percentile(latencies, 99)),
+            'queue_mean_ms': float(np.mean([latency['queue'] for latency in server_latencies]) * 1000),
+            'compute_mean_ms': float(np.mean([latency['compute'] for latency in server_latencies]) * 1000),
+            'batch_size_mean': float(np.mean([latency['batch_size'] for latency in server_latencies]))
+        })
+    return stats
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    audio_files = []
+    for path in args.audio_path:
+        with open(path, 'rb') as audio_file:
+            audio_files.append(audio_file.read())
+
+    results = []
+    for concurrency in [int(c) for c in args.concurrency.split(',')]:
+        stats = run(args.url, audio_files, args.requests, concurrency)
+        results.append(stats)
+        print("Concurrency {concurrency}: {throughput:.2f} requests/s, {errors} errors".format(**stats))
+        if stats['requests']:
+            print("  latency mean {latency_mean_ms:.1f}ms p50 {latency_p50_ms:.1f}ms p90 {latency_p90_ms:.1f}ms "
+                  "p99 {latency_p99_ms:.1f}ms".format(**stats))
+            print("  server queue {queue_mean_ms:.1f}ms compute {compute_mean_ms:.1f}ms "
+                  "mean batch size {batch_size_mean:.2f}".format(**stats))
+    if args.output_path:
+        with open(args.output_path, 'w') as output_file:
+            json.dump(results, output_file, indent=2)